@@ -23,12 +23,27 @@ cli.add_command(make_skycoord_table_command)
 from .generate_observers import make_observer_table_command
 cli.add_command(make_observer_table_command)
 
+from .convert import convert_tables_command
+cli.add_command(convert_tables_command)
+
 from .benchmark import benchmark_celestial
 cli.add_command(benchmark_celestial)
 
 from .benchmark import benchmark_horizontal
 cli.add_command(benchmark_horizontal)
 
+from .speed import benchmark_speed
+cli.add_command(benchmark_speed)
+
+from .memory import benchmark_memory
+cli.add_command(benchmark_memory)
+
+from .scaling import benchmark_scaling
+cli.add_command(benchmark_scaling)
+
+from .coldstart import benchmark_coldstart
+cli.add_command(benchmark_coldstart)
+
 # TODO: this doesn't work ... not important for now.
 # from .run_benchmark import benchmark_all
 # cli.add_command(benchmark_all)
@@ -36,14 +51,19 @@ cli.add_command(benchmark_horizontal)
 from .html import summary_celestial
 cli.add_command(summary_celestial)
 
+from .html import render_summary_command
+cli.add_command(render_summary_command)
+
 from .plot import plots_command
 cli.add_command(plots_command)
 
 
 @click.command(name='tool-info')
-def tool_info():
+@click.option('--refresh', is_flag=True,
+              help='Check tools again instead of using the cached info.')
+def tool_info(refresh):
     """Print tool availability and version info"""
-    print(utils.TOOL_INFO)
+    print(utils.get_tool_info(refresh=refresh))
 cli.add_command(tool_info)
 
 
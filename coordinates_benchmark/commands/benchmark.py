@@ -2,20 +2,128 @@
 """Run the coordinates benchmark"""
 from __future__ import absolute_import, division, print_function
 
+import os
+import shutil
 import logging
+import time
+import cProfile
+import collections
+import contextlib
 import click
+from astropy.table import Table
 from .. import utils
+from .. import parallel
+from .. import profiling
+
+
+def _format_results(results):
+    results['lon'] %= 360
+
+    for col in ['lon', 'lat']:
+        results[col].format = utils.FLOAT_FORMAT_OUTPUT
+
+    return results
+
+
+def _transform_chunk(module, chunk, in_system, out_systems):
+    """Convert one chunk of positions to all ``out_systems``.
+
+    Tools with a `transform_celestial_many` function convert to the
+    intermediate system they use internally only once for all outputs.
+    """
+    if hasattr(module, 'transform_celestial_many'):
+        return module.transform_celestial_many(chunk, in_system, out_systems)
+
+    results = dict()
+    for out_system in out_systems:
+        systems = {'in': in_system, 'out': out_system}
+        results[out_system] = module.transform_celestial(chunk, systems)
+    return results
+
+
+def run_celestial(tool, in_system, out_systems, text=False, chunk_size=utils.CHUNK_SIZE,
+                  profile=False):
+    """Run celestial conversions from one input system for one tool and write the results.
+
+    Positions are streamed through the tool in chunks of ``chunk_size``
+    and results are appended to the output files chunk by chunk.
+    With ``profile=True`` the conversion calls are profiled (see `profiling`).
+    """
+    module = utils.get_test_module(tool)
+    positions = utils.get_positions()
+    profiler = cProfile.Profile() if profile else None
+
+    with contextlib.ExitStack() as stack:
+        writers = dict()
+        for out_system in out_systems:
+            systems = {'in': in_system, 'out': out_system}
+            filename = utils.celestial_filename(tool, systems)
+            writers[out_system] = stack.enter_context(
+                utils.TableChunkWriter(filename, len(positions), text=text))
+
+        for chunk in utils.iter_chunks(positions, chunk_size):
+            with profiling.profiled(profiler):
+                results = _transform_chunk(module, chunk, in_system, out_systems)
+            for out_system in out_systems:
+                writers[out_system].write(_format_results(results[out_system]))
+
+    if profiler is not None:
+        profiling.write_profile(profiler, tool, '{}_to_{}'.format(in_system, '+'.join(out_systems)))
+
+
+def _group_conversions(module, conversions):
+    """Group conversions by input system, if the tool supports it.
+
+    Returns a list of ``(in_system, out_systems)`` tuples.
+    """
+    if not hasattr(module, 'transform_celestial_many'):
+        return [(systems['in'], [systems['out']]) for systems in conversions]
+
+    groups = collections.OrderedDict()
+    for systems in conversions:
+        groups.setdefault(systems['in'], []).append(systems['out'])
+    return list(groups.items())
+
+
+def _is_up_to_date(filename, key, manifest, text=False):
+    """Check if results exist and were made with the same task key."""
+    if manifest.get(filename) != key or not os.path.exists(filename):
+        return False
+    return not text or os.path.exists(utils.text_filename(filename))
 
 
 @click.command()
 @click.option('--tools', default='all',
               help='Which tools to benchmark.')
-def benchmark_celestial(tools):
-    """Run celestial coordinate conversions."""
+@click.option('--jobs', default=1,
+              help='Number of worker processes.')
+@click.option('--text/--no-text', default=False,
+              help='Also export results as text tables.')
+@click.option('--force', is_flag=True,
+              help='Re-run all tasks, even if their results are up to date.')
+@click.option('--chunk-size', default=utils.CHUNK_SIZE, type=click.IntRange(min=1),
+              help='Number of positions converted at once.')
+@click.option('--timeout', type=float, default=None,
+              help='Time limit per task (in sec), tasks run in worker processes.')
+@click.option('--memory-limit', type=float, default=None,
+              help='Memory limit per worker process (in MB).')
+@click.option('--profile', is_flag=True,
+              help='Profile each task and write the results in `output/profiles`.')
+def benchmark_celestial(tools, jobs, text, force, chunk_size, timeout, memory_limit, profile):
+    """Run celestial coordinate conversions.
+
+    With ``--jobs``, ``--timeout`` or ``--memory-limit`` each task runs in a
+    worker process, so that a hanging or crashing tool only fails its own tasks.
+    Failed tasks are listed in ``output/tools/failures.json``.
+    """
     tools = utils.select_tools(tools)
 
-    positions = utils.get_positions()
+    # Results are only re-computed if the input positions, tool adapter code,
+    # tool version or conversion changed since the last run (see `manifest`).
+    manifest = utils.read_manifest()
+    keys = {}
 
+    tasks, labels = [], []
     for tool in tools:
         utils.make_tool_output_dir(tool)
         module = utils.get_test_module(tool)
@@ -25,39 +133,168 @@ def benchmark_celestial(tools):
             continue
 
         logging.info('Running `transform_celestial` for tool `{}`'.format(tool))
+        conversions = []
         for systems in utils.CELESTIAL_CONVERSIONS:
 
-            supported_systems = utils.CELESTIAL_SYSTEMS
-            if hasattr(module, 'SUPPORTED_SYSTEMS'):
-                supported_systems = module.SUPPORTED_SYSTEMS
-
-            if not set(systems.values()).issubset(supported_systems):
+            if not utils.supports_systems(module, systems):
                 logging.debug('Skipping {}'.format(systems))
                 continue
 
-            results = module.transform_celestial(positions, systems)
+            filename = utils.celestial_filename(tool, systems)
+            keys[filename] = utils.celestial_task_key(tool, systems)
+            if not force and _is_up_to_date(filename, keys[filename], manifest, text):
+                logging.debug('Up to date: {}'.format(filename))
+                continue
 
-            results['lon'] %= 360
+            conversions.append(systems)
 
-            for col in ['lon', 'lat']:
-                results[col].format = utils.FLOAT_FORMAT_OUTPUT
+        if profile and conversions:
+            profiling.clear_profiles(tool)
 
-            filename = utils.celestial_filename(tool, systems)
-            logging.info('Writing {}'.format(filename))
-            results.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+        for in_system, out_systems in _group_conversions(module, conversions):
+            tasks.append((tool, in_system, out_systems, text, chunk_size, profile))
+            labels.append(utils.task_label(tool, {'in': in_system, 'out': ','.join(out_systems)}))
+
+    n_skipped = len(keys) - sum(len(task[2]) for task in tasks)
+    if n_skipped:
+        logging.info('Skipping {} conversions with up to date results (use --force to re-run)'
+                     ''.format(n_skipped))
+
+    failures = utils.read_failures()
+
+    def task_filenames(task):
+        tool, in_system, out_systems = task[:3]
+        return [utils.celestial_filename(tool, {'in': in_system, 'out': out_system})
+                for out_system in out_systems]
+
+    def update_manifest(task, result):
+        for filename in task_filenames(task):
+            manifest[filename] = keys[filename]
+            failures.pop(filename, None)
+
+    def record_failure(task, error):
+        for filename in task_filenames(task):
+            failures[filename] = error
+            # Re-run the task next time, even if the task key didn't change
+            manifest.pop(filename, None)
+
+    try:
+        parallel.run_tasks(run_celestial, tasks, jobs=jobs, labels=labels,
+                           callback=update_manifest, errback=record_failure,
+                           timeout=timeout, memory_limit=memory_limit)
+    finally:
+        utils.write_manifest(manifest)
+        utils.write_failures(failures)
+        if profile and tasks:
+            profiling.write_index()
+
+
+def _format_horizontal_results(results):
+    results['az'] %= 360
+
+    for col in ['az', 'alt']:
+        results[col].format = utils.FLOAT_FORMAT_OUTPUT
+
+    return results
+
+
+def run_horizontal_shard(tool, start, stop, use_subset=False, profile=False):
+    """Convert all positions for the observers ``start:stop`` and write the results.
+
+    Returns the duration (in sec) of the `convert_horizontal` call.
+    With ``profile=True`` the call is profiled (see `profiling`).
+    """
+    module = utils.get_test_module(tool)
+    positions = utils.get_positions(use_subset=use_subset)
+    observers = utils.get_observers(use_subset=use_subset)[start:stop]
+    profiler = cProfile.Profile() if profile else None
+
+    t_start = time.perf_counter()
+    with profiling.profiled(profiler):
+        results = module.convert_horizontal(positions, observers)
+    duration = time.perf_counter() - t_start
+
+    if profiler is not None:
+        profiling.write_profile(profiler, tool, 'fk5_to_horizontal_{}_{}'.format(start, stop))
+
+    filename = utils.horizontal_shard_filename(tool, start, stop)
+    utils.write_table(_format_horizontal_results(results), filename)
+
+    return duration
+
+
+def make_shards(n_observers, shard_size):
+    """Split observers into ``(start, stop)`` index ranges of ``shard_size``."""
+    return [(start, min(start + shard_size, n_observers))
+            for start in range(0, n_observers, shard_size)]
+
+
+def merge_horizontal_shards(tool, shards, durations, n_positions, text=False):
+    """Merge shard results (in observer order) and write the per-shard timing.
+
+    Results are in the same order as for one `convert_horizontal` call
+    for all observers, since those are observer-major. The shard directory
+    (which only holds shards of this run) is removed once merged.
+    """
+    filenames = [utils.horizontal_shard_filename(tool, start, stop) for start, stop in shards]
+    n_rows = sum((stop - start) * n_positions for start, stop in shards)
+
+    def iter_chunks():
+        for filename in filenames:
+            chunk = utils.read_table(filename)
+            for col in ['az', 'alt']:
+                chunk[col].format = utils.FLOAT_FORMAT_OUTPUT
+            yield chunk
+
+    utils.write_table_chunks(iter_chunks(), utils.horizontal_filename(tool), n_rows, text=text)
+
+    shutil.rmtree(utils.horizontal_shards_dir(tool))
+
+    timing = Table()
+    timing['observer_start'] = [start for start, _ in shards]
+    timing['observer_stop'] = [stop for _, stop in shards]
+    timing['n_coords'] = [(stop - start) * n_positions for start, stop in shards]
+    timing['duration'] = durations
+    timing['duration'].format = '%.4f'
+    timing['duration'].unit = 's'
+    timing['coords_per_sec'] = timing['n_coords'] / timing['duration']
+    timing['coords_per_sec'].format = '%.4g'
+
+    filename = utils.horizontal_timing_filename(tool)
+    logging.info('Writing {}'.format(filename))
+    timing.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
 
 
 @click.command()
 @click.option('--tools', default='all',
               help='Which tools to benchmark.')
-def benchmark_horizontal(tools):
-    """Run horizontal coordinate conversions."""
+@click.option('--jobs', default=1,
+              help='Number of worker processes.')
+@click.option('--text/--no-text', default=False,
+              help='Also export results as text tables.')
+@click.option('--subset/--no-subset', default=False,
+              help='Only use the debug subset of 10 positions and 5 observers.')
+@click.option('--shard-size', default=5, type=click.IntRange(min=1),
+              help='Number of observers converted per task.')
+@click.option('--timeout', type=float, default=None,
+              help='Time limit per task (in sec), tasks run in worker processes.')
+@click.option('--memory-limit', type=float, default=None,
+              help='Memory limit per worker process (in MB).')
+@click.option('--profile', is_flag=True,
+              help='Profile each task and write the results in `output/profiles`.')
+def benchmark_horizontal(tools, jobs, text, subset, shard_size, timeout, memory_limit, profile):
+    """Run horizontal coordinate conversions.
+
+    The observers are split into shards, which are converted in parallel
+    (with ``--jobs``) and merged per tool once all its shards are done.
+    Failed shards are listed in ``output/tools/failures.json``.
+    """
     tools = utils.select_tools(tools)
 
-    # TODO: for now we're running on a small subset for debugging
-    positions = utils.get_positions(use_subset=True)
-    observers = utils.get_observers(use_subset=True)
+    n_positions = len(utils.get_positions(use_subset=subset))
+    shards = make_shards(len(utils.get_observers(use_subset=subset)), shard_size)
 
+    tasks, labels = [], []
     for tool in tools:
         utils.make_tool_output_dir(tool)
         module = utils.get_test_module(tool)
@@ -67,15 +304,48 @@ def benchmark_horizontal(tools):
             continue
 
         logging.info('Running `convert_horizontal` for tool `{}`'.format(tool))
-        results = module.convert_horizontal(positions, observers)
-        results['az'] %= 360
+        # Shards left by an earlier (failed or differently sharded) run must not be merged
+        shards_dir = utils.horizontal_shards_dir(tool)
+        if os.path.exists(shards_dir):
+            shutil.rmtree(shards_dir)
+        utils.make_output_dir(os.path.join('tools', tool, 'horizontal_shards'))
+        if profile:
+            profiling.clear_profiles(tool)
+        for start, stop in shards:
+            tasks.append((tool, start, stop, subset, profile))
+            labels.append('{} observers {}:{}'.format(tool, start, stop))
 
-        for col in ['az', 'alt']:
-            results[col].format = utils.FLOAT_FORMAT_OUTPUT
+    # Shard durations by tool and shard, tools are merged once all shards are done
+    durations = collections.defaultdict(dict)
 
+    failures = utils.read_failures()
+
+    def merge_tool(task, duration):
+        tool, start, stop = task[:3]
+        durations[tool][start, stop] = duration
+        if len(durations[tool]) == len(shards):
+            merge_horizontal_shards(tool, shards, [durations[tool][_] for _ in shards],
+                                    n_positions, text=text)
+            failures.pop(utils.horizontal_filename(tool), None)
+
+    def record_failure(task, error):
+        tool, start, stop = task[:3]
         filename = utils.horizontal_filename(tool)
-        logging.info('Writing {}'.format(filename))
-        results.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+        failures[filename] = 'Observers {}:{}: {}'.format(start, stop, error)
+        # Remove the results of an earlier run, so that they aren't taken for this run's
+        for filename in [filename, utils.text_filename(filename), utils.horizontal_timing_filename(tool)]:
+            if os.path.exists(filename):
+                logging.info('Removing stale {}'.format(filename))
+                os.remove(filename)
+
+    try:
+        parallel.run_tasks(run_horizontal_shard, tasks, jobs=jobs, labels=labels,
+                           callback=merge_tool, errback=record_failure,
+                           timeout=timeout, memory_limit=memory_limit)
+    finally:
+        utils.write_failures(failures)
+        if profile and tasks:
+            profiling.write_index()
 
 
 @click.command()
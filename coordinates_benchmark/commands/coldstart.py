@@ -0,0 +1,260 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Measure the cold start cost of each tool.
+
+Each measurement runs in a fresh Python process (see `COLDSTART_SCRIPT`), which
+times separately:
+
+* ``base_import`` -- importing NumPy and `astropy.table`, which all tools use for
+  their inputs and outputs
+* ``tool_import`` -- importing the tool module (and the library it wraps)
+* ``first_call`` -- the first call, which includes one-time setup
+  (e.g. building a frame graph or loading IERS data)
+* ``steady_call`` -- the median of the following calls
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import json
+import logging
+import subprocess
+import numpy as np
+import click
+from astropy.table import Table
+from .. import utils
+from .. import parallel
+
+# Written to stderr by `COLDSTART_SCRIPT` before and after the tool import,
+# to find the tool import in the ``-X importtime`` output
+IMPORT_MARKER = '#coldstart-tool-import'
+
+# Run in a fresh process with the JSON encoded arguments of `measure_coldstart`
+COLDSTART_SCRIPT = """
+import sys
+import json
+import time
+
+args = json.loads(sys.argv[1])
+
+start = time.perf_counter()
+import numpy as np
+from astropy.table import Table
+base_import = time.perf_counter() - start
+
+sys.stderr.write(args['marker'] + '\\n')
+sys.stderr.flush()
+start = time.perf_counter()
+# Not `importlib.import_module`, which `-X importtime` doesn't see
+__import__('coordinates_benchmark.tools.' + args['tool'])
+tool_import = time.perf_counter() - start
+sys.stderr.write(args['marker'] + '\\n')
+sys.stderr.flush()
+module = sys.modules['coordinates_benchmark.tools.' + args['tool']]
+
+
+def read_table(filename, n_rows):
+    if filename.endswith('.npy'):
+        table = Table(np.load(filename))
+    else:
+        table = Table.read(filename, format='ascii.fixed_width_two_line')
+    return table[:n_rows]
+
+
+positions = read_table(args['positions'], args['n_positions'])
+if args['function'] == 'transform_celestial':
+    func_args = (positions, args['systems'])
+else:
+    func_args = (positions, read_table(args['observers'], args['n_observers']))
+func = getattr(module, args['function'])
+
+start = time.perf_counter()
+func(*func_args)
+first_call = time.perf_counter() - start
+
+durations = []
+for _ in range(args['repeat']):
+    start = time.perf_counter()
+    func(*func_args)
+    durations.append(time.perf_counter() - start)
+
+print(json.dumps(dict(base_import=base_import, tool_import=tool_import, first_call=first_call,
+                      steady_call=float(np.median(durations)))))
+"""
+
+TIME_NAMES = ['base_import', 'tool_import', 'first_call', 'steady_call']
+
+
+def _repo_dir():
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def run_script(args, importtime=False, timeout=None):
+    """Run `COLDSTART_SCRIPT` in a fresh process.
+
+    Returns the measured times (in sec) and the stderr output.
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', COLDSTART_SCRIPT, json.dumps(args)]
+
+    process = subprocess.run(command, cwd=_repo_dir(), timeout=timeout,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError('Cold start process failed (exit code {}):\n{}'
+                           ''.format(process.returncode, process.stderr))
+
+    return json.loads(process.stdout.splitlines()[-1]), process.stderr
+
+
+def parse_importtime(stderr):
+    """Parse the ``-X importtime`` output of the tool import.
+
+    Returns a list of ``(self, cumulative, module)`` with times in sec,
+    sorted by self time.
+    """
+    lines = stderr.split(IMPORT_MARKER + '\n')[1].splitlines()
+
+    rows = []
+    for line in lines:
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_time, cumulative_time, name = line[len('import time:'):].split('|')
+        rows.append((1e-6 * int(self_time), 1e-6 * int(cumulative_time), name.rstrip()))
+
+    return sorted(rows, reverse=True)
+
+
+def measure_coldstart(tool, function, systems, repeat=5, runs=3, importtime=0, timeout=None):
+    """Measure the cold start of one tool and function in ``runs`` fresh processes.
+
+    One untimed run comes first, so that byte code files are already written.
+    The median of each time over the runs is used. With ``importtime > 0``
+    one more run with ``-X importtime`` lists the slowest modules of the tool import.
+    """
+    use_subset = function == 'convert_horizontal'
+    args = dict(tool=tool, function=function, systems=systems, repeat=repeat,
+                marker=IMPORT_MARKER,
+                positions=os.path.abspath(utils.input_path('skycoords')),
+                n_positions=len(utils.get_positions(use_subset=use_subset)),
+                observers=os.path.abspath(utils.input_path('observers')),
+                n_observers=len(utils.get_observers(use_subset=use_subset)))
+
+    run_script(args, timeout=timeout)
+    times = [run_script(args, timeout=timeout)[0] for _ in range(runs)]
+
+    row = dict(tool=tool, function=function, system_in=systems['in'], system_out=systems['out'],
+               runs=runs)
+    for name in TIME_NAMES:
+        row[name] = 1e3 * np.median([_[name] for _ in times])
+
+    if importtime:
+        _, stderr = run_script(args, importtime=True, timeout=timeout)
+        row['importtime'] = parse_importtime(stderr)
+
+    return row
+
+
+def write_importtime(tool, rows):
+    """Write the full ``-X importtime`` breakdown of a tool import."""
+    utils.make_output_dir('coldstart')
+    filename = utils.coldstart_importtime_filename(tool)
+    logging.info('Writing {}'.format(filename))
+    with open(filename, 'w') as fh:
+        fh.write('{:>12s} {:>12s}  {}\n'.format('self [ms]', 'cumul. [ms]', 'module'))
+        for self_time, cumulative_time, name in rows:
+            fh.write('{:12.3f} {:12.3f}  {}\n'.format(1e3 * self_time, 1e3 * cumulative_time, name))
+
+
+def make_coldstart_table(rows):
+    """Make a table of cold start results (one row per tool and function)."""
+    names = ['tool', 'function', 'system_in', 'system_out', 'runs'] + TIME_NAMES
+
+    table = Table(rows=[[row[name] for name in names] for row in rows], names=names)
+    for name in TIME_NAMES:
+        table[name].unit = 'ms'
+        table[name].format = '%.3f'
+
+    return table
+
+
+def read_coldstart_table():
+    """Read the cold start results as a list of rows.
+
+    Returns an empty list if there are no results (see `benchmark_coldstart`).
+    """
+    filename = utils.coldstart_filename()
+    if not os.path.exists(filename):
+        return []
+
+    logging.debug('Reading {}'.format(filename))
+    return list(Table.read(filename, format=utils.TABLE_FORMAT))
+
+
+@click.command(name='benchmark-coldstart')
+@click.option('--tools', default='all',
+              help='Which tools to benchmark.')
+@click.option('--conversion', default='fk5:ecliptic',
+              help='Conversion used for `transform_celestial` (supported by all tools by default).')
+@click.option('--repeat', default=5,
+              help='Number of calls after the first call for the steady state time.')
+@click.option('--runs', default=3,
+              help='Number of fresh processes per tool and function (the median is used).')
+@click.option('--importtime', default=0,
+              help='Run once more with `-X importtime` and show this many slowest modules of the tool import.')
+@click.option('--timeout', default=None, type=float,
+              help='Time limit per process (in sec).')
+def benchmark_coldstart(tools, conversion, repeat, runs, importtime, timeout):
+    """Measure import time, first call and steady state call time in fresh processes."""
+    tools = utils.select_tools(tools)
+    system_in, system_out = conversion.split(':')
+    systems = {'in': system_in, 'out': system_out}
+
+    tasks, labels = [], []
+    for tool in tools:
+        module = utils.get_test_module(tool)
+
+        functions = []
+        if hasattr(module, 'transform_celestial') and utils.supports_systems(module, systems):
+            functions.append(('transform_celestial', systems))
+        else:
+            logging.warning('{} does not support `transform_celestial` for {}'.format(tool, conversion))
+
+        if hasattr(module, 'convert_horizontal'):
+            functions.append(('convert_horizontal', {'in': 'fk5', 'out': 'horizontal'}))
+        else:
+            logging.warning('{} does not support `convert_horizontal`'.format(tool))
+
+        # The import is the same for all functions, so it is only broken down once per tool
+        tool_importtime = importtime
+        for function, function_systems in functions:
+            tasks.append((tool, function, function_systems, repeat, runs, tool_importtime, timeout))
+            labels.append(utils.task_label(tool, function_systems))
+            tool_importtime = 0
+
+    rows = []
+
+    def add_row(task, row):
+        rows.append(row)
+        if 'importtime' in row:
+            write_importtime(row['tool'], row['importtime'])
+            click.echo('Slowest {} modules of the `{}` import (self, cumulative in ms):'
+                       ''.format(importtime, row['tool']))
+            for self_time, cumulative_time, name in row['importtime'][:importtime]:
+                click.echo('    {:10.3f} {:10.3f}  {}'.format(1e3 * self_time, 1e3 * cumulative_time,
+                                                             name.strip()))
+
+    try:
+        # Tasks run one after another, so that they don't slow each other down
+        parallel.run_tasks(measure_coldstart, tasks, labels=labels, callback=add_row)
+    finally:
+        if rows:
+            table = make_coldstart_table(rows)
+            table.sort(['tool', 'function'])
+            utils.make_output_dir('')
+            filename = utils.coldstart_filename()
+            logging.info('Writing {}'.format(filename))
+            table.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+        else:
+            logging.warning('No cold start results to write.')
@@ -0,0 +1,64 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Convert input and result tables between binary and text format."""
+from __future__ import absolute_import, division, print_function
+
+import os
+import glob
+import logging
+import click
+from astropy.table import Table
+from .. import utils
+
+
+def _find_tables(extension):
+    """Find input and result tables with a given file extension."""
+    patterns = [os.path.join('input', '*' + extension),
+                os.path.join('output', 'tools', '*', '*' + extension)]
+    filenames = []
+    for pattern in patterns:
+        filenames += sorted(glob.glob(pattern))
+    return filenames
+
+
+def text_to_binary(filename):
+    """Convert a text table to a `.npy` table next to it."""
+    table = Table.read(filename, format=utils.TABLE_FORMAT)
+    utils.write_table(table, os.path.splitext(filename)[0] + utils.BINARY_EXTENSION)
+
+
+def binary_to_text(filename):
+    """Export a `.npy` table to a text table next to it."""
+    table = utils.read_table(filename)
+
+    if filename.startswith('input'):
+        float_format = utils.FLOAT_FORMAT_INPUT
+    else:
+        float_format = utils.FLOAT_FORMAT_OUTPUT
+
+    for col in table.itercols():
+        if col.dtype.kind == 'f':
+            col.format = float_format
+
+    filename = utils.text_filename(filename)
+    logging.info('Writing {}'.format(filename))
+    table.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+
+
+@click.command(name='convert-tables')
+@click.option('--to', 'to_format', default='binary',
+              type=click.Choice(['binary', 'text']),
+              help='Format to convert input and result tables to.')
+def convert_tables_command(to_format):
+    """Convert input and result tables to binary or text format."""
+    if to_format == 'binary':
+        filenames = _find_tables(utils.TEXT_EXTENSION)
+        convert = text_to_binary
+    else:
+        filenames = _find_tables(utils.BINARY_EXTENSION)
+        convert = binary_to_text
+
+    if not filenames:
+        logging.warning('No tables found to convert.')
+
+    for filename in filenames:
+        convert(filename)
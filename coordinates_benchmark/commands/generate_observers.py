@@ -2,7 +2,6 @@
 """Create lists of observers."""
 from __future__ import absolute_import, division, print_function
 
-import logging
 import itertools
 import numpy as np
 from astropy.time import Time
@@ -61,9 +60,10 @@ def make_observer_table(n_samples=5):
 
 
 @click.command(name='make_observer_table')
-def make_observer_table_command():
+@click.option('--text/--no-text', default=True,
+              help='Also export the table as text table.')
+def make_observer_table_command(text):
     """Generate table of observers."""
     table = make_observer_table()
-    filename = 'input/observers.txt'
-    logging.info('Writing {}'.format(filename))
-    table.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+    filename = utils.input_filename('observers')
+    utils.write_table(table, filename, text=text)
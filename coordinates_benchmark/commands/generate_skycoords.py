@@ -2,40 +2,68 @@
 """Create lists of sky coordinates."""
 from __future__ import absolute_import, division, print_function
 
-import logging
 import numpy as np
 import click
 from astropy.table import Table
 from .. import utils
 
 
-def make_skycoord_table(n_samples=1000):
-    """Generate table of random sky coordinates.
+def iter_skycoord_chunks(n_samples=1000, chunk_size=utils.CHUNK_SIZE):
+    """Generate random sky coordinates in chunks of at most ``chunk_size`` rows.
+
+    The values don't depend on the chunk size, i.e. they are the same as
+    when drawing all ``n_samples`` longitudes and then all latitudes at once.
 
-    TODO: change this to make an Astropy table.
+    With ``n_samples=0`` one empty chunk (with all columns) is generated.
 
     Columns:
     - lon      : longitude in deg
     - lat      : latitude in deg
     """
-    np.random.seed(12345)
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1, got {}'.format(chunk_size))
+    if n_samples < 0:
+        raise ValueError('n_samples must not be negative, got {}'.format(n_samples))
+
+    # Latitudes are drawn after all longitudes from the same random stream,
+    # so we use a second generator and skip over the longitude draws.
+    random_lon = np.random.RandomState(12345)
+    random_lat = np.random.RandomState(12345)
+    for start in range(0, n_samples, chunk_size):
+        random_lat.uniform(size=min(chunk_size, n_samples - start))
+
+    for start in range(0, max(n_samples, 1), chunk_size):
+        size = min(chunk_size, n_samples - start)
+
+        # Sample uniformly on the unit sphere
+        table = Table()
+        table['lon'] = random_lon.uniform(0., 360., size)
+        table['lat'] = np.degrees(np.arcsin(random_lat.uniform(-1., 1., size)))
 
-    # Sample uniformly on the unit sphere
-    table = Table()
-    table['lon'] = np.random.uniform(0., 360., n_samples)
-    table['lat'] = np.degrees(np.arcsin(np.random.uniform(-1., 1., n_samples)))
+        for col in ['lon', 'lat']:
+            table[col].format = utils.FLOAT_FORMAT_INPUT
 
-    for col in ['lon', 'lat']:
-        table[col].format = utils.FLOAT_FORMAT_INPUT
+        yield table
 
-    return table
+
+def make_skycoord_table(n_samples=1000):
+    """Generate table of random sky coordinates.
+
+    See `iter_skycoord_chunks` for the columns.
+    """
+    return next(iter_skycoord_chunks(n_samples, chunk_size=max(n_samples, 1)))
 
 
 @click.command(name='make_skycoord_table')
-def make_skycoord_table_command():
+@click.option('--n-samples', default=1000, type=click.IntRange(min=0),
+              help='Number of sky coordinates.')
+@click.option('--chunk-size', default=utils.CHUNK_SIZE, type=click.IntRange(min=1),
+              help='Number of sky coordinates generated at once.')
+@click.option('--text/--no-text', default=True,
+              help='Also export the table as text table.')
+def make_skycoord_table_command(n_samples, chunk_size, text):
     """Generate table of random sky coordinates."""
-    table = make_skycoord_table()
+    chunks = iter_skycoord_chunks(n_samples, chunk_size)
 
-    filename = 'input/skycoords.txt'
-    logging.info('Writing {}'.format(filename))
-    table.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+    filename = utils.input_filename('skycoords')
+    utils.write_table_chunks(chunks, filename, n_samples, text=text)
@@ -1,10 +1,38 @@
-"""Make a html page summarising the results."""
+"""Make a html page summarising the results.
+
+The summary is made in two stages:
+
+* `make_summary_data` computes the separation stats of all tool pairs and collects
+  the speed and memory results. They are written to ``output/summary_data.json``
+  (and ``.csv``), see `write_summary_data`.
+* `render_summary` writes the text, list and matrix views from that data only,
+  using the templates in ``www/templates``, and the data files of the report
+  page (see `write_report`). It doesn't read ``output/tools``, so re-rendering
+  takes milliseconds.
+"""
+import csv
+import json
 import logging
+import math
 import os
 import itertools
-import numpy as np
 import click
 from .. import utils
+from ..stats import compute_stats, STATS_NAMES
+from .plot import make_plots
+from .speed import read_speed_table
+from .memory import read_memory_table
+from .coldstart import read_coldstart_table, TIME_NAMES as COLDSTART_NAMES
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'www', 'templates')
+
+# Names of the per tool and conversion speed and memory results in the summary data
+PERFORMANCE_NAMES = ['coords_per_sec', 'rss_per_coord', 'traced_per_coord']
+
+# Number of decimals of the stats (in arcsec) in the report data files
+REPORT_DECIMALS = 6
+
+_TEMPLATES = {}
 
 
 def _accuracy_color(mean):
@@ -18,164 +46,303 @@ def _accuracy_color(mean):
     return color
 
 
-def write_html_header(fh):
-    fh.write("<html>\n")
-    fh.write("   <head>\n")
-    fh.write("      <link href='style.css' rel='stylesheet' type='text/css'\n")
-    fh.write("   </head>\n")
-    fh.write("   <body>\n")
-    fh.write("      <p align='center'>Summary of differences in arcseconds</p>\n")
-    fh.write("      <p align='center'>Green means < 10 milli-arcsec, orange < 1 arcsec and red > 1 arcsec</p>\n")
-
-
-def write_html_footer(fh):
-    fh.write("   </body>\n")
-    fh.write("</html>\n")
-
-
-def write_html_table_header(fh, systems):
-    fh.write("<a name='{in}_{out}'></a><a class='anchor' href='#{in}_{out}'><h2>{in} to {out}</h2></a>".format(**systems))
-    fh.write("<table align='center'>\n")
-    fh.write("  <tr>\n")
-    fh.write("    <th width=80>Tool 1</th>\n")
-    fh.write("    <th width=80>Tool 2</th>\n")
-    fh.write("    <th width=80>System 1</th>\n")
-    fh.write("    <th width=80>System 2</th>\n")
-    fh.write("    <th width=80>Median</th>\n")
-    fh.write("    <th width=80>Mean</th>\n")
-    fh.write("    <th width=80>Max</th>\n")
-    fh.write("    <th width=80>Std. Dev.</th>\n")
-    fh.write("    <th width=80>Plot</th>\n")
-    fh.write("  </tr>\n")
-
-
-def _compare_celestial(tool1, tool2, systems, f_txt, f_html):
-
-    try:
-        table = utils.celestial_separation_table(tool1, tool2, systems)
-    except IOError as exc:
-        logging.debug(str(exc))
-        return
-
-    # Compute stats
-    diff = table['separation']
-    median = np.median(diff)
-    mean = np.mean(diff)
-    max = np.max(diff)
-    std = np.std(diff)
-
-    # Print out stats
-    system1, system2 = systems['in'], systems['out']
-    fmt = ('{tool1:10s} {tool2:10s} {system1:10s} {system2:10s} '
-           '{median:12.6f} {mean:12.6f} {max:12.6f} {std:12.6f}')
-    f_txt.write(fmt.format(**locals()) + "\n")
-
-    # Write out to HTML
-    color = _accuracy_color(mean)
-    plot_filename = utils.plot_filename(tool1, tool2, systems, inc_root_dir=False)
-
-    f_html.write("  <tr>\n")
-    f_html.write("    <td align='center'>{tool1:10s}</td>\n".format(tool1=tool1))
-    f_html.write("    <td align='center'>{tool2:10s}</td>\n".format(tool2=tool2))
-    f_html.write("    <td align='center'>{system1:10s}</td>\n".format(system1=system1))
-    f_html.write("    <td align='center'>{system2:10s}</td>\n".format(system2=system2))
-    f_html.write("    <td align='right' class='{color}'>{median:12.6f}</td>\n".format(color=color, median=median))
-    f_html.write("    <td align='right' class='{color}'>{mean:12.6f}</td>\n".format(color=color, mean=mean))
-    f_html.write("    <td align='right' class='{color}'>{max:12.6f}</td>\n".format(color=color, max=max))
-    f_html.write("    <td align='right' class='{color}'>{std:12.6f}</td>\n".format(color=color, std=std))
-    f_html.write("    <td align='center'><a href='{plot_filename}'>Plot</a></td>\n".format(plot_filename=plot_filename))
-    f_html.write("  </tr>\n")
-
-
-def write_tool_comparison_table(fh, tool):
-    other_tools = sorted(t for t in utils.TOOLS if t != tool)
-
-    fh.write('<a name="{0}"></a><a class="anchor" href="#{0}"><h2>{0}</h2></a>\n'.format(tool))
-    fh.write('<table align="center">\n')
-    fh.write('<tr><th width="80">\n')
-    for t in other_tools:
-        fh.write('<th width="80">{}\n'.format(t))
-    pairs = itertools.permutations(utils.CELESTIAL_SYSTEMS, 2)
-    for systems in pairs:
-        systems = {'in': systems[0], 'out': systems[1]}
-        try:
-            c = utils.celestial_results(tool, systems)
-        except IOError:
-            continue
+def _stats_key(tool1, tool2, systems):
+    # Stats are symmetric, so both tool orders share one key
+    tool1, tool2 = sorted([tool1, tool2])
+    return tool1, tool2, systems['in'], systems['out']
+
+
+def _json_value(value):
+    """Convert a table value to a JSON value (``None`` for missing or NaN values)."""
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def make_summary_data(jobs=1):
+    """Compute the stats and collect everything the summary views show.
+
+    Returns a dict with:
+
+    * ``tools`` and ``conversions`` -- all tools and conversions, in display order
+    * ``results`` -- the conversions with results, for each tool
+    * ``pairs`` -- the separation stats (in arcsec) of each tool pair and conversion
+    * ``performance`` -- speed and memory results of each tool and conversion,
+      if `benchmark-speed` or `benchmark-memory` was run (``None`` if missing)
+    * ``coldstart`` -- import and call times (in ms) of each tool and function,
+      if `benchmark-coldstart` was run
+    """
+    stats = compute_stats(jobs=jobs)
+    stats = dict(((row['tool1'], row['tool2'], row['system_in'], row['system_out']), row)
+                 for row in stats)
+
+    conversions = [dict(systems) for systems in utils.CELESTIAL_CONVERSIONS]
 
-        fh.write('<tr><th>{} &#8594; {}\n'.format(systems['in'], systems['out']))
-        for t in other_tools:
-            try:
-                d = utils.celestial_results(t, systems)
-            except IOError:
-                fh.write('<td> &mdash;\n')
+    results = dict()
+    for tool in utils.TOOLS:
+        results[tool] = [systems for systems in conversions
+                         if os.path.exists(utils.celestial_filename(tool, systems))]
+
+    pairs = []
+    for systems in conversions:
+        for tool1, tool2 in utils.TOOL_PAIRS:
+            row = stats.get(_stats_key(tool1, tool2, systems))
+            if row is None:
                 continue
-            diff = utils.angular_separation_deg_to_arcsec(c['lon'], c['lat'], d['lon'], d['lat'])
-            mean = np.mean(diff)
-            color = _accuracy_color(mean)
-            fmt = '<td class="{}">{:.6f}<br>{:.6f}<br>{:.6f}<br>{:.6f}'
-            fh.write(fmt.format(color, np.median(diff), mean,
-                                np.max(diff), np.std(diff)))
+            pair = dict(tool1=tool1, tool2=tool2, system_in=systems['in'], system_out=systems['out'])
+            pair.update((name, float(row[name])) for name in STATS_NAMES)
+            pairs.append(pair)
+
+    speed = read_speed_table()
+    memory = read_memory_table()
+    performance = []
+    for key in sorted(set(speed) | set(memory)):
+        tool, system_in, system_out = key
+        entry = dict(tool=tool, system_in=system_in, system_out=system_out)
+        entry['coords_per_sec'] = _json_value(speed[key]['coords_per_sec'] if key in speed else None)
+        for name in PERFORMANCE_NAMES[1:]:
+            entry[name] = _json_value(memory[key][name] if key in memory else None)
+        performance.append(entry)
+
+    coldstart = []
+    for row in read_coldstart_table():
+        entry = dict((name, str(row[name])) for name in ['tool', 'function', 'system_in', 'system_out'])
+        entry.update((name, float(row[name])) for name in COLDSTART_NAMES)
+        coldstart.append(entry)
+
+    return dict(tools=list(utils.TOOLS), conversions=conversions, results=results,
+                pairs=pairs, performance=performance, coldstart=coldstart)
+
+
+def write_summary_data(data):
+    """Write the summary data as JSON, and the pair stats (with throughput) as CSV."""
+    utils.make_output_dir('')
+
+    filename = utils.summary_data_filename('.json')
+    logging.info('Writing {}'.format(filename))
+    with open(filename, 'w') as fh:
+        json.dump(data, fh, indent=1)
+
+    speed = dict(((entry['tool'], entry['system_in'], entry['system_out']), entry['coords_per_sec'])
+                 for entry in data['performance'])
+
+    names = ['tool1', 'tool2', 'system_in', 'system_out'] + STATS_NAMES
+    names += ['tool1_coords_per_sec', 'tool2_coords_per_sec']
+
+    filename = utils.summary_data_filename('.csv')
+    logging.info('Writing {}'.format(filename))
+    with open(filename, 'w') as fh:
+        writer = csv.DictWriter(fh, names, lineterminator='\n')
+        writer.writeheader()
+        for pair in data['pairs']:
+            row = dict(pair)
+            for tool in ['tool1', 'tool2']:
+                row[tool + '_coords_per_sec'] = speed.get((pair[tool], pair['system_in'], pair['system_out']))
+            writer.writerow(row)
+
+
+def read_summary_data():
+    filename = utils.summary_data_filename('.json')
+    logging.debug('Reading {}'.format(filename))
+    with open(filename) as fh:
+        return json.load(fh)
 
-        fh.write('<th align="left">Median<br>Mean<br>Max<br>Std.Dev.\n')
-    fh.write('</tr>\n')
-    fh.write('</table>\n')
 
+def get_template(name):
+    """Read (and cache) the template ``name`` (a `str.format` string)."""
+    if name not in _TEMPLATES:
+        with open(os.path.join(TEMPLATE_DIR, name)) as fh:
+            _TEMPLATES[name] = fh.read()
+    return _TEMPLATES[name]
 
-def summary(txt_filename='summary.txt',
-            html_filename='summary.html',
-            html_matrix_filename='summary_matrix.html'):
-    """Write txt and html summary"""
-    f_txt = open(os.path.join('output', txt_filename), 'w')
-    f_html = open(os.path.join('output', html_filename), 'w')
 
+def render(name, **kwargs):
+    return get_template(name).format(**kwargs)
+
+
+def _format_number(value, fmt, missing):
+    return missing if value is None else fmt.format(value)
+
+
+def render_txt(data):
+    """Text view: stats of all pairs, then speed and memory use."""
     fmt = ('{tool1:10s} {tool2:10s} {system1:10s} {system2:10s} '
            '{median:>12s} {mean:>12s} {max:>12s} {std:>12s}')
 
     labels = dict(tool1="Tool 1", tool2="Tool 2", system1='System 1', system2='System 2',
                   median='Median', mean='Mean', max='Max', std='Std.Dev.')
 
-    f_txt.write(fmt.format(**labels) + "\n")
-    f_txt.write('-' * 94 + "\n")
+    lines = [fmt.format(**labels), '-' * 94]
 
-    write_html_header(f_html)
+    fmt = ('{tool1:10s} {tool2:10s} {system_in:10s} {system_out:10s} '
+           '{median:12.6f} {mean:12.6f} {max:12.6f} {std:12.6f}')
+    for pair in data['pairs']:
+        lines.append(fmt.format(**pair))
+
+    if data['performance']:
+        fmt = '{:10s} {:10s} {:10s} {:>12s} {:>12s} {:>12s}'
+        lines += ['', 'Speed in coordinates per second, memory use in bytes per coordinate', '']
+        lines.append(fmt.format('Tool', 'System 1', 'System 2', 'Coords/sec', 'Peak RSS', 'Traced peak'))
+        lines.append('-' * 73)
+        for entry in data['performance']:
+            lines.append(fmt.format(entry['tool'], entry['system_in'], entry['system_out'],
+                                    _format_number(entry['coords_per_sec'], '{:.4g}', '-'),
+                                    _format_number(entry['rss_per_coord'], '{:.1f}', '-'),
+                                    _format_number(entry['traced_per_coord'], '{:.1f}', '-')))
+
+    if data.get('coldstart'):
+        fmt = '{:10s} {:20s} {:10s} {:10s} {:>12s} {:>12s} {:>12s} {:>12s}'
+        lines += ['', 'Cold start times in ms (in fresh processes)', '']
+        lines.append(fmt.format('Tool', 'Function', 'System 1', 'System 2',
+                                'Base import', 'Tool import', 'First call', 'Steady call'))
+        lines.append('-' * 107)
+        fmt = ('{tool:10s} {function:20s} {system_in:10s} {system_out:10s} '
+               '{base_import:12.3f} {tool_import:12.3f} {first_call:12.3f} {steady_call:12.3f}')
+        for entry in data['coldstart']:
+            lines.append(fmt.format(**entry))
+
+    return '\n'.join(lines) + '\n'
+
+
+def render_performance_table(data, systems):
+    """Speed and memory use of each tool for one conversion (empty if there are none)."""
+    entries = dict((entry['tool'], entry) for entry in data['performance']
+                   if entry['system_in'] == systems['in'] and entry['system_out'] == systems['out'])
+    if not entries:
+        return ''
+
+    rows = []
+    for tool in data['tools']:
+        if tool not in entries:
+            continue
+        entry = entries[tool]
+        rows.append(render('performance_row.html', tool=tool,
+                           coords_per_sec=_format_number(entry['coords_per_sec'], '{:.4g}', '&mdash;'),
+                           rss_per_coord=_format_number(entry['rss_per_coord'], '{:.1f}', '&mdash;'),
+                           traced_per_coord=_format_number(entry['traced_per_coord'], '{:.1f}', '&mdash;')))
 
-    f_html.write('<p align="center"><a href="summary_matrix.html"><b>See also matrix view</b></a></p>')
+    return render('performance_table.html', rows=''.join(rows))
 
-    for systems in utils.CELESTIAL_CONVERSIONS:
-        logging.info('Summarizing celestial conversions: %s -> %s' % (systems['in'], systems['out']))
 
-        write_html_table_header(f_html, systems)
+def render_coldstart_table(data):
+    """Import and call times of each tool (empty if there are none)."""
+    if not data.get('coldstart'):
+        return ''
 
-        for tool1, tool2 in utils.TOOL_PAIRS:
-            _compare_celestial(tool1, tool2, systems, f_txt, f_html)
+    rows = ''.join(render('coldstart_row.html', **entry) for entry in data['coldstart'])
+    return render('coldstart_table.html', rows=rows)
 
-        f_html.write("   </table>\n")
 
-    write_html_footer(f_html)
+def render_list(data):
+    """List view: one table of all tool pairs per conversion."""
+    sections = []
+    for systems in data['conversions']:
+        rows = []
+        for pair in data['pairs']:
+            if pair['system_in'] != systems['in'] or pair['system_out'] != systems['out']:
+                continue
+            plot = utils.plot_filename(pair['tool1'], pair['tool2'], systems, inc_root_dir=False)
+            rows.append(render('list_row.html', color=_accuracy_color(pair['mean']), plot=plot, **pair))
 
-    f_html.close()
-    f_txt.close()
+        sections.append(render('list_conversion.html', rows=''.join(rows),
+                               performance=render_performance_table(data, systems), **systems))
 
-    logging.info('Writing output/%s' % txt_filename)
-    logging.info('Writing output/%s' % html_filename)
+    sections.append(render_coldstart_table(data))
 
-    # Write comparison matrix
+    return render('page.html', link='summary_matrix.html', link_name='matrix',
+                  content=''.join(sections))
 
-    f_matrix_html = open(os.path.join('output', html_matrix_filename), 'w')
 
-    write_html_header(f_matrix_html)
+def render_matrix(data):
+    """Matrix view: one table per tool, comparing it with all other tools."""
+    stats = dict(((pair['tool1'], pair['tool2'], pair['system_in'], pair['system_out']), pair)
+                 for pair in data['pairs'])
 
-    f_matrix_html.write('<p align="center"><a href="summary.html"><b>See also list view</b></a></p>')
+    sections = []
+    for tool in data['tools']:
+        other_tools = sorted(t for t in data['tools'] if t != tool)
+        header = ''.join(render('matrix_header.html', tool=t) for t in other_tools)
+
+        results = [(systems['in'], systems['out']) for systems in data['results'][tool]]
+        rows = []
+        for system_in, system_out in itertools.permutations(utils.CELESTIAL_SYSTEMS, 2):
+            if (system_in, system_out) not in results:
+                continue
+
+            systems = {'in': system_in, 'out': system_out}
+            cells = []
+            for t in other_tools:
+                cell = stats.get(_stats_key(tool, t, systems))
+                if cell is None:
+                    cells.append(render('matrix_empty_cell.html'))
+                else:
+                    cells.append(render('matrix_cell.html', color=_accuracy_color(cell['mean']), **cell))
+            rows.append(render('matrix_row.html', cells=''.join(cells), **systems))
+
+        sections.append(render('matrix_tool.html', tool=tool, header=header, rows=''.join(rows)))
+
+    return render('page.html', link='summary.html', link_name='list',
+                  content=''.join(sections))
 
-    for tool in utils.TOOLS:
-        write_tool_comparison_table(f_matrix_html, tool)
 
-    write_html_footer(f_matrix_html)
+def _write_json(filename, data):
+    logging.debug('Writing {}'.format(filename))
+    with open(filename, 'w') as fh:
+        json.dump(data, fh, separators=(',', ':'))
 
-    f_matrix_html.close()
 
-    logging.info('Writing output/%s' % html_matrix_filename)
+def write_report(data):
+    """Write the data files of the report page (``report.html``).
+
+    The page itself is static (see ``www/report.js``). It loads ``index.json``
+    and then only the file of the selected conversion, so its size doesn't
+    grow with the number of tools and conversions. Plots are shown as
+    thumbnails and the full plot is only loaded on click.
+    """
+    utils.make_output_dir('report')
+
+    index = dict(tools=data['tools'], conversions=[], coldstart=data.get('coldstart', []))
+    for systems in data['conversions']:
+        name = '{in}_to_{out}'.format(**systems)
+
+        pairs = []
+        for pair in data['pairs']:
+            if pair['system_in'] != systems['in'] or pair['system_out'] != systems['out']:
+                continue
+            entry = dict(tool1=pair['tool1'], tool2=pair['tool2'])
+            entry.update((stat, round(pair[stat], REPORT_DECIMALS)) for stat in STATS_NAMES)
+            entry['plot'] = utils.plot_filename(pair['tool1'], pair['tool2'], systems, inc_root_dir=False)
+            entry['thumbnail'] = utils.plot_thumbnail_filename(pair['tool1'], pair['tool2'], systems,
+                                                               inc_root_dir=False)
+            pairs.append(entry)
+
+        tools = [tool for tool in data['tools'] if systems in data['results'][tool]]
+        performance = [entry for entry in data['performance']
+                       if entry['system_in'] == systems['in'] and entry['system_out'] == systems['out']]
+
+        _write_json(utils.report_filename(name + '.json'),
+                    dict(systems, tools=tools, pairs=pairs, performance=performance))
+        index['conversions'].append(dict(systems, name=name, file=name + '.json', n_pairs=len(pairs)))
+
+    filename = utils.report_filename('index.json')
+    logging.info('Writing {} (and one file per conversion)'.format(filename))
+    _write_json(filename, index)
+
+
+def render_summary(data, txt_filename='summary.txt',
+                   html_filename='summary.html',
+                   html_matrix_filename='summary_matrix.html'):
+    """Write the txt, html list and html matrix views of the summary data."""
+    views = [(txt_filename, render_txt), (html_filename, render_list),
+             (html_matrix_filename, render_matrix)]
+    for filename, render_view in views:
+        filename = os.path.join('output', filename)
+        logging.info('Writing {}'.format(filename))
+        with open(filename, 'w') as fh:
+            fh.write(render_view(data))
+
+    write_report(data)
 
 
 def copy_static():
@@ -184,15 +351,30 @@ def copy_static():
     repo_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
     www_dir = os.path.join(repo_dir, 'coordinates_benchmark', 'www')
     output_dir = os.path.join(repo_dir, 'output')
-    filenames = ['style.css']
+    filenames = ['style.css', 'report.html', 'report.js']
     for filename in filenames:
         shutil.copy(os.path.join(www_dir, filename),
                     os.path.join(output_dir, filename))
 
 
 @click.command()
-def summary_celestial():
-    """For now: summary and HTML page."""
-    # """Summarize all results into a few stats"""
-    summary()
+@click.option('--jobs', default=1,
+              help='Number of worker processes.')
+@click.option('--plots/--no-plots', default=False,
+              help='Also make all plots, re-using the memory-mapped results of the summary.')
+def summary_celestial(jobs, plots):
+    """Compute the summary data and render the summary pages."""
+    data = make_summary_data(jobs=jobs)
+    write_summary_data(data)
+    render_summary(data)
+    copy_static()
+
+    if plots:
+        make_plots(utils.available_tools(), jobs=jobs)
+
+
+@click.command(name='render-summary')
+def render_summary_command():
+    """Render the summary pages from the summary data."""
+    render_summary(read_summary_data())
     copy_static()
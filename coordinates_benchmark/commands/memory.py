@@ -0,0 +1,238 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Measure the memory use of the coordinate conversions."""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import gc
+import ctypes
+import logging
+import tracemalloc
+import numpy as np
+import click
+from astropy.table import Table
+from .. import utils
+from .. import parallel
+
+# Number of positions converted before measuring, to trigger one-time setup
+N_WARMUP = 10
+
+# Only take a new snapshot if traced memory grew by this factor (see `call_with_snapshot`)
+SNAPSHOT_GROWTH = 1.1
+
+
+def reset_peak_rss():
+    """Reset the peak resident set size of the current process to its current value.
+
+    Freed heap memory is first returned to the system (with glibc), so that
+    memory re-used by the next call shows up as an RSS increase.
+    Only supported on Linux. Returns `False` if the peak can't be reset.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def peak_rss():
+    """Peak resident set size of the current process since the last `reset_peak_rss` (in bytes).
+
+    Returns NaN where ``/proc`` isn't available.
+    """
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return 1024 * int(line.split()[1])
+    except (IOError, OSError, ValueError):
+        pass
+    return np.nan
+
+
+def current_rss():
+    """Resident set size of the current process (in bytes).
+
+    Returns NaN where ``/proc`` isn't available.
+    """
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return np.nan
+
+
+def call_with_snapshot(func, args):
+    """Call ``func(*args)`` and take a `tracemalloc` snapshot near its peak memory use.
+
+    A snapshot taken after the call only shows what is still allocated (e.g. the
+    result), so snapshots are taken whenever a function returns and traced memory
+    has grown by `SNAPSHOT_GROWTH` since the last one. This is slow.
+    """
+    state = dict(size=0, snapshot=None)
+
+    def profile(frame, event, arg):
+        if event not in ('return', 'c_return'):
+            return
+        size = tracemalloc.get_traced_memory()[0]
+        if size > SNAPSHOT_GROWTH * state['size']:
+            state['size'] = size
+            state['snapshot'] = tracemalloc.take_snapshot()
+
+    sys.setprofile(profile)
+    try:
+        func(*args)
+    finally:
+        sys.setprofile(None)
+
+    return state['snapshot']
+
+
+def measure_memory(tool, function, systems, use_subset=True, top=0):
+    """Measure the memory use of one call, in a fresh process.
+
+    The peak RSS increase (NaN if the peak can't be reset, see
+    `reset_peak_rss`) is measured for a plain call, the peak of
+    `tracemalloc` traced memory for a second call. With ``top > 0``
+    the ``top`` allocation sites near the traced peak are listed.
+    """
+    module = utils.get_test_module(tool)
+    func = getattr(module, function)
+
+    # Copy inputs into memory, so that reading them doesn't count
+    if function == 'transform_celestial':
+        positions = utils.get_positions().copy()
+        args = (positions, systems)
+        warmup_args = (positions[:N_WARMUP], systems)
+        n_coords = len(positions)
+    else:
+        positions = utils.get_positions(use_subset=use_subset).copy()
+        observers = utils.get_observers(use_subset=use_subset).copy()
+        args = (positions, observers)
+        warmup_args = (positions[:N_WARMUP], observers[:1])
+        n_coords = len(positions) * len(observers)
+
+    func(*warmup_args)
+
+    # The peak RSS is a high-water mark over the lifetime of the process, so it is reset
+    # first. Where that isn't possible the RSS increase is unknown (NaN), not zero.
+    rss_peak = np.nan
+    if reset_peak_rss():
+        rss_start = current_rss()
+        func(*args)
+        rss_peak = max(0, peak_rss() - rss_start)
+
+    tracemalloc.start()
+    try:
+        if top:
+            snapshot = call_with_snapshot(func, args)
+        else:
+            func(*args)
+        traced_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    row = dict(tool=tool, function=function,
+               system_in=systems['in'], system_out=systems['out'],
+               n_coords=n_coords, rss_peak=rss_peak, traced_peak=traced_peak,
+               rss_per_coord=rss_peak / n_coords, traced_per_coord=traced_peak / n_coords)
+
+    if top:
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        row['sites'] = [str(stat) for stat in snapshot.statistics('lineno')[:top]]
+
+    return row
+
+
+def make_memory_table(rows):
+    """Make a table of memory results (one row per tool and conversion)."""
+    names = ['tool', 'function', 'system_in', 'system_out', 'n_coords',
+             'rss_peak', 'traced_peak', 'rss_per_coord', 'traced_per_coord']
+
+    table = Table(rows=[[row[name] for name in names] for row in rows], names=names)
+    for name in names[5:]:
+        table[name].unit = 'byte'
+        table[name].format = '%.1f'
+
+    return table
+
+
+def read_memory_table():
+    """Read the memory results as a dict of rows by (tool, system_in, system_out).
+
+    Returns an empty dict if there are no results (see `benchmark_memory`).
+    """
+    filename = utils.memory_filename()
+    if not os.path.exists(filename):
+        return {}
+
+    logging.debug('Reading {}'.format(filename))
+    table = Table.read(filename, format=utils.TABLE_FORMAT)
+    return dict(((row['tool'], row['system_in'], row['system_out']), row) for row in table)
+
+
+@click.command(name='benchmark-memory')
+@click.option('--tools', default='all',
+              help='Which tools to benchmark.')
+@click.option('--jobs', default=1,
+              help='Number of worker processes.')
+@click.option('--horizontal-subset/--no-horizontal-subset', default=True,
+              help='Use the debug subset of positions and observers for `convert_horizontal`.')
+@click.option('--top', default=0,
+              help='Show this many top allocation sites for each call (slow).')
+def benchmark_memory(tools, jobs, horizontal_subset, top):
+    """Measure peak memory use per coordinate.
+
+    Each call is measured in a fresh worker process.
+    """
+    tools = utils.select_tools(tools)
+
+    tasks, labels = [], []
+    for tool in tools:
+        module = utils.get_test_module(tool)
+
+        if hasattr(module, 'transform_celestial'):
+            for systems in utils.CELESTIAL_CONVERSIONS:
+                if utils.supports_systems(module, systems):
+                    tasks.append((tool, 'transform_celestial', systems, horizontal_subset, top))
+                    labels.append(utils.task_label(tool, systems))
+        else:
+            logging.warning('{} does not support `transform_celestial`'.format(tool))
+
+        if hasattr(module, 'convert_horizontal'):
+            systems = {'in': 'fk5', 'out': 'horizontal'}
+            tasks.append((tool, 'convert_horizontal', systems, horizontal_subset, top))
+            labels.append(utils.task_label(tool, systems))
+        else:
+            logging.warning('{} does not support `convert_horizontal`'.format(tool))
+
+    rows = []
+
+    def add_row(task, row):
+        rows.append(row)
+        if top:
+            systems = {'in': row['system_in'], 'out': row['system_out']}
+            click.echo('Top {} allocation sites for {}:'.format(top, utils.task_label(row['tool'], systems)))
+            for site in row['sites']:
+                click.echo('    {}'.format(site))
+
+    try:
+        parallel.run_tasks(measure_memory, tasks, jobs=jobs, labels=labels,
+                           callback=add_row, fresh=True)
+    finally:
+        if rows:
+            table = make_memory_table(rows)
+            table.sort(['tool', 'function', 'system_in', 'system_out'])
+            utils.make_output_dir('')
+            filename = utils.memory_filename()
+            logging.info('Writing {}'.format(filename))
+            table.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+        else:
+            logging.warning('No memory results to write.')
@@ -1,40 +1,85 @@
 """Make plots to be included in the html page."""
+import hashlib
+import json
 import os
 import logging
 import numpy as np
 import click
 from .. import utils
+from .. import parallel
+
+# Figure templates by (vmin, vmax), re-used for all plots made in one process
+_FIGURES = {}
+
+# Size of the thumbnails relative to the plots
+THUMBNAIL_SCALE = 0.25
+
+
+def get_figure(vmin=-3, vmax=1):
+    """Get the figure template with an empty scatter plot, colorbar and title.
+
+    The figure is only created once per process, plots only swap the
+    scatter data and the title (see `make_plot`).
+
+    Returns ``(fig, scatter, title)``.
+    """
+    key = vmin, vmax
+    if key not in _FIGURES:
+        import matplotlib.pyplot as plt
+
+        fig = plt.figure(figsize=(7, 5))
+        ax = fig.add_subplot(1, 1, 1, projection='aitoff')
+        s = ax.scatter([], [], s=10, c=[], vmin=vmin, vmax=vmax, lw=0, cmap=plt.cm.RdYlGn_r)
+        ax.grid()
+        axc = fig.add_axes([0.2, 0.1, 0.6, 0.03])
+        cb = fig.colorbar(s, cax=axc, orientation='horizontal')
+        cb.set_ticks([-3, -2, -1, 0, 1])
+        cb.set_label('Difference in arcsec')
+        title = ax.set_title('', y=1.1)
+
+        _FIGURES[key] = fig, s, title
+
+    return _FIGURES[key]
+
+
+def plot_key(tool1, tool2, systems):
+    """Hash of everything that determines one plot (see `make_plots`).
+
+    That is the results of both tools and the plotting code.
+    Returns `None` if results for one of the tools are missing.
+    """
+    filenames = [utils.celestial_filename(tool, systems) for tool in [tool1, tool2]]
+    if not all(os.path.exists(filename) for filename in filenames):
+        return None
+
+    key = [utils.file_hash(filename) for filename in filenames]
+    key.append(utils.file_hash(__file__))
+    return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
 
 
 def make_plot(tool1, tool2, systems,
               vmin=-3, vmax=1):
-    """Make a comparison plot for celestial conversion"""
-    import matplotlib.pyplot as plt
+    """Make a comparison plot (and its thumbnail) for celestial conversion
 
+    Returns `True` if the plot was written.
+    """
     try:
         table = utils.celestial_separation_table(tool1, tool2, systems)
     except IOError as exc:
         logging.debug(str(exc))
-        return
+        return False
 
     # Clip diff values to plotting range, otherwise values
     # below the min will not show up in the plot (probably white)
     with np.errstate(divide='ignore'):
         diff = np.clip(np.log10(table['separation']), vmin, vmax)
 
-    fig = plt.figure(figsize=(7, 5))
-    ax = fig.add_subplot(1, 1, 1, projection='aitoff')
-    s = ax.scatter(np.radians(table['lon']), np.radians(table['lat']),
-                   s=10, c=diff, vmin=vmin, vmax=vmax, lw=0, cmap=plt.cm.RdYlGn_r)
-    ax.grid()
-    axc = fig.add_axes([0.2, 0.1, 0.6, 0.03])
-    cb = fig.colorbar(s, cax=axc, orientation='horizontal')
-    cb.set_ticks([-3, -2, -1, 0, 1])
-    cb.set_label('Difference in arcsec')
+    fig, s, title = get_figure(vmin, vmax)
+    s.set_offsets(np.column_stack([np.radians(table['lon']), np.radians(table['lat'])]))
+    s.set_array(diff)
 
     fmt = '{} vs {} for conversion {} -> {}'
-    title = fmt.format(tool1, tool2, systems['in'], systems['out'])
-    ax.set_title(title, y=1.1)
+    title.set_text(fmt.format(tool1, tool2, systems['in'], systems['out']))
 
     filename = utils.plot_filename(tool1, tool2, systems)
     logging.info('Writing {}'.format(filename))
@@ -44,20 +89,68 @@ def make_plot(tool1, tool2, systems,
     # platforms (otherwise the image comparison when deploying fails).
     fig.savefig(filename)
 
-    plt.close(fig)
+    filename = utils.plot_thumbnail_filename(tool1, tool2, systems)
+    logging.debug('Writing {}'.format(filename))
+    fig.savefig(filename, dpi=THUMBNAIL_SCALE * fig.dpi)
 
+    return True
 
-@click.command(name='plots')
-@click.option('--tools', default='all',
-              help='Which tools to benchmark.')
-def plots_command(tools):
-    """Create plots to illustrate results"""
-    utils.make_output_dir('plots')
-    tools = utils.select_tools(tools)
 
+def make_plots(tools, jobs=1, force=False):
+    """Make comparison plots for the given tools and all conversions.
+
+    Plots are only re-made if the results of one of the tools (or the
+    plotting code) changed since the last run, unless ``force=True``.
+    """
+    utils.make_output_dir(os.path.join('plots', 'thumbnails'))
+
+    manifest_filename = utils.plot_manifest_filename()
+    manifest = utils.read_manifest(manifest_filename)
+    keys = {}
+
+    tasks, labels = [], []
     for tool in tools:
-        logging.info('Making plots for tool {tool}'.format(tool=tool))
         other_tools = [_[1] for _ in utils.TOOL_PAIRS if _[0] == tool]
         for tool2 in other_tools:
             for systems in utils.CELESTIAL_CONVERSIONS:
-                make_plot(tool, tool2, systems)
+                filename = utils.plot_filename(tool, tool2, systems)
+                keys[filename] = plot_key(tool, tool2, systems)
+                if keys[filename] is None:
+                    continue
+                thumbnail_filename = utils.plot_thumbnail_filename(tool, tool2, systems)
+                if (not force and manifest.get(filename) == keys[filename]
+                        and os.path.exists(filename) and os.path.exists(thumbnail_filename)):
+                    continue
+
+                tasks.append((tool, tool2, systems))
+                labels.append(utils.task_label(tool + ' vs ' + tool2, systems))
+
+    n_skipped = sum(key is not None for key in keys.values()) - len(tasks)
+    if n_skipped:
+        logging.info('Skipping {} plots with unchanged results (use --force to re-make)'
+                     ''.format(n_skipped))
+
+    def update_manifest(task, written):
+        if written:
+            filename = utils.plot_filename(*task)
+            manifest[filename] = keys[filename]
+
+    logging.info('Making plots for tools {tools}'.format(tools=', '.join(tools)))
+    try:
+        parallel.run_tasks(make_plot, tasks, jobs=jobs, labels=labels,
+                           callback=update_manifest)
+    finally:
+        utils.write_manifest(manifest, manifest_filename)
+
+
+@click.command(name='plots')
+@click.option('--tools', default='all',
+              help='Which tools to benchmark.')
+@click.option('--jobs', default=1,
+              help='Number of worker processes.')
+@click.option('--force', is_flag=True,
+              help='Re-make all plots, even if the results didn\'t change.')
+def plots_command(tools, jobs, force):
+    """Create plots to illustrate results"""
+    tools = utils.select_tools(tools)
+    make_plots(tools, jobs=jobs, force=force)
@@ -0,0 +1,238 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Measure how the conversion time scales with the number of positions.
+
+For each tool and conversion `transform_celestial` is timed for N on a log grid,
+and ``time = overhead + N * per_coord`` is fitted to the results (see `fit_scaling`).
+The fixed overhead (e.g. frame setup) dominates for small N, the cost per
+position for large N.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import logging
+import numpy as np
+import click
+from astropy.table import Table
+from .. import utils
+from .. import parallel
+from .speed import function_modes, time_calls
+
+
+def n_grid(n_min=10, n_max=int(1e7)):
+    """Numbers of positions: one per decade from ``n_min`` to ``n_max``."""
+    return np.logspace(np.log10(n_min), np.log10(n_max),
+                       int(round(np.log10(n_max / n_min))) + 1).round().astype(int)
+
+
+def make_positions(positions, n_coords):
+    """Repeat the input positions to get ``n_coords`` positions."""
+    table = Table()
+    table['lon'] = np.resize(np.asarray(positions['lon']), n_coords)
+    table['lat'] = np.resize(np.asarray(positions['lat']), n_coords)
+    return table
+
+
+def fit_scaling(n_coords, durations):
+    """Fit ``durations = overhead + n_coords * per_coord`` (all in sec).
+
+    Uses least squares on the relative residuals, since the durations span
+    several orders of magnitude. Returns ``(overhead, per_coord)``.
+    """
+    n_coords = np.asarray(n_coords, dtype=float)
+    durations = np.asarray(durations, dtype=float)
+    matrix = np.column_stack([np.ones_like(n_coords), n_coords]) / durations[:, np.newaxis]
+    (overhead, per_coord), _, _, _ = np.linalg.lstsq(matrix, np.ones_like(n_coords), rcond=None)
+    return overhead, per_coord
+
+
+def time_scaling(tool, systems, grid, repeat, max_time, scalar):
+    """Time one tool and conversion for all N in ``grid``.
+
+    Larger N are skipped once one call took more than ``max_time`` (in sec).
+    Returns one row per mode and N (the minimum duration of ``repeat`` calls).
+    """
+    module = utils.get_test_module(tool)
+    positions = utils.get_positions()
+
+    rows = []
+    for mode, kwargs in function_modes(module, 'transform_celestial', scalar):
+        logging.info('Timing `transform_celestial` ({}) for tool `{}`: {} -> {}'
+                     ''.format(mode, tool, systems['in'], systems['out']))
+
+        # Setup costs that are only paid once per process aren't part of the overhead
+        module.transform_celestial(make_positions(positions, grid[0]), systems, **kwargs)
+
+        for n_coords in grid:
+            coords = make_positions(positions, n_coords)
+            durations = time_calls(module.transform_celestial, (coords, systems), kwargs,
+                                   repeat=repeat, warmup=0)
+            rows.append(dict(tool=tool, mode=mode, system_in=systems['in'],
+                             system_out=systems['out'], n_coords=n_coords,
+                             duration=np.min(durations)))
+            if np.min(durations) > max_time:
+                logging.info('Skipping N > {} for tool `{}` ({})'.format(n_coords, tool, mode))
+                break
+
+    return rows
+
+
+def make_fit_table(table):
+    """Fit the overhead and cost per position for each tool, mode and conversion.
+
+    ``n_equal`` is the N where both costs are the same. Groups with
+    less than two N are skipped (with a warning).
+    """
+    rows = []
+    for group in table.group_by(['tool', 'mode', 'system_in', 'system_out']).groups:
+        if len(group) < 2:
+            systems = {'in': group['system_in'][0], 'out': group['system_out'][0]}
+            logging.warning('Not fitting {} ({}): less than two N'
+                            ''.format(utils.task_label(group['tool'][0], systems), group['mode'][0]))
+            continue
+        overhead, per_coord = fit_scaling(group['n_coords'], group['duration'])
+        rows.append([group['tool'][0], group['mode'][0], group['system_in'][0],
+                     group['system_out'][0], 1e3 * overhead, 1e6 * per_coord,
+                     overhead / per_coord, np.max(group['n_coords'])])
+
+    names = ['tool', 'mode', 'system_in', 'system_out', 'overhead', 'per_coord', 'n_equal', 'n_max']
+    dtype = ['U16', 'U16', 'U16', 'U16', 'f8', 'f8', 'f8', 'i8']
+    fits = Table(rows=rows or None, names=names, dtype=dtype)
+    fits['overhead'].unit = 'ms'
+    fits['overhead'].format = '%.4f'
+    fits['per_coord'].unit = 'us'
+    fits['per_coord'].format = '%.5f'
+    fits['n_equal'].format = '%.4g'
+
+    return fits
+
+
+def plot_scaling(table, fits, systems):
+    """Plot the time per call against N for all tools for one conversion."""
+    import matplotlib.pyplot as plt
+
+    mask = (table['system_in'] == systems['in']) & (table['system_out'] == systems['out'])
+    table = table[mask]
+    if not len(table):
+        return
+
+    fig, ax = plt.subplots(figsize=(7, 5))
+    for group in table.group_by(['tool', 'mode']).groups:
+        tool, mode = group['tool'][0], group['mode'][0]
+        label = tool if mode == 'default' else '{} ({})'.format(tool, mode)
+        points = ax.plot(group['n_coords'], group['duration'], 'o', label=label)
+
+        fit = fits[(fits['tool'] == tool) & (fits['mode'] == mode) &
+                   (fits['system_in'] == systems['in']) & (fits['system_out'] == systems['out'])]
+        if len(fit):
+            n_coords = np.logspace(np.log10(group['n_coords'].min()),
+                                   np.log10(group['n_coords'].max()), 100)
+            duration = 1e-3 * fit['overhead'][0] + 1e-6 * fit['per_coord'][0] * n_coords
+            ax.plot(n_coords, duration, '-', color=points[0].get_color())
+
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('Number of positions')
+    ax.set_ylabel('Time per call (sec)')
+    ax.set_title('Scaling of {} -> {} (lines: overhead + N x cost per position)'
+                 ''.format(systems['in'], systems['out']))
+    ax.grid(which='major', alpha=0.3)
+    ax.legend(loc='upper left', fontsize='small')
+
+    filename = utils.scaling_plot_filename(systems)
+    logging.info('Writing {}'.format(filename))
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def parse_conversions(conversions):
+    """Parse a comma-separated list of ``in:out`` conversions (or ``all``)."""
+    if conversions == 'all':
+        return utils.CELESTIAL_CONVERSIONS
+
+    systems = []
+    for conversion in conversions.split(','):
+        system_in, system_out = conversion.split(':')
+        systems.append({'in': system_in, 'out': system_out})
+    return systems
+
+
+@click.command(name='benchmark-scaling')
+@click.option('--tools', default='all',
+              help='Which tools to benchmark.')
+@click.option('--conversions', default='all',
+              help='Comma-separated conversions to time, e.g. `fk5:galactic,fk4:icrs`.')
+@click.option('--n-min', default=10,
+              help='Smallest number of positions.')
+@click.option('--n-max', default=int(1e7),
+              help='Largest number of positions.')
+@click.option('--repeat', default=3,
+              help='Number of timed calls per N (the fastest is used).')
+@click.option('--max-time', default=10.,
+              help='Skip larger N once one call took longer than this (in sec).')
+@click.option('--scalar/--no-scalar', default=False,
+              help='Also time the slow reference code path of batched functions.')
+@click.option('--jobs', default=1,
+              help='Number of worker processes (timings are less reliable with more than one).')
+@click.option('--timeout', default=None, type=float,
+              help='Time limit per tool and conversion (in sec).')
+@click.option('--memory-limit', default=None, type=float,
+              help='Memory limit per worker process (in MB).')
+def benchmark_scaling(tools, conversions, n_min, n_max, repeat, max_time, scalar,
+                      jobs, timeout, memory_limit):
+    """Measure call time against number of positions, and fit overhead and cost per position."""
+    tools = utils.select_tools(tools)
+    conversions = parse_conversions(conversions)
+    grid = n_grid(n_min, n_max)
+
+    tasks, labels = [], []
+    for tool in tools:
+        module = utils.get_test_module(tool)
+        if not hasattr(module, 'transform_celestial'):
+            logging.warning('{} does not support `transform_celestial`'.format(tool))
+            continue
+        for systems in conversions:
+            if utils.supports_systems(module, systems):
+                tasks.append((tool, systems, grid, repeat, max_time, scalar))
+                labels.append(utils.task_label(tool, systems))
+
+    rows = []
+
+    def add_rows(task, result):
+        rows.extend(result)
+
+    try:
+        parallel.run_tasks(time_scaling, tasks, jobs=jobs, labels=labels, callback=add_rows,
+                           timeout=timeout, memory_limit=memory_limit)
+    finally:
+        if rows:
+            write_scaling(rows, conversions)
+        else:
+            logging.warning('No scaling results to write.')
+
+
+def write_scaling(rows, conversions):
+    """Write the timings, the fits and one plot per conversion."""
+    names = ['tool', 'mode', 'system_in', 'system_out', 'n_coords', 'duration']
+    table = Table(rows=[[row[name] for name in names] for row in rows], names=names)
+    table['duration'].unit = 's'
+    table['duration'].format = '%.4g'
+    table.sort(['tool', 'mode', 'system_in', 'system_out', 'n_coords'])
+
+    # Write the timings first, so that they are kept if anything below fails
+    utils.make_output_dir('plots')
+    filename = utils.scaling_filename()
+    logging.info('Writing {}'.format(filename))
+    table.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+
+    fits = make_fit_table(table)
+    filename = utils.scaling_fit_filename()
+    if len(fits):
+        logging.info('Writing {}'.format(filename))
+        fits.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
+    else:
+        logging.warning('No fits to write (use at least two N).')
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    for systems in conversions:
+        plot_scaling(table, fits, systems)
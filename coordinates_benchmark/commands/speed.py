@@ -0,0 +1,212 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Measure the speed of the coordinate conversions."""
+from __future__ import absolute_import, division, print_function
+
+import os
+import logging
+import time
+import cProfile
+import numpy as np
+import click
+from astropy.table import Table
+from .. import utils
+from .. import profiling
+
+# Latency percentiles (in percent) to report
+PERCENTILES = [50, 90, 99]
+
+
+def function_modes(module, name, scalar=True):
+    """List the code paths to time for one function of a tool module.
+
+    Returns a list of ``(mode, kwargs)`` tuples. Functions listed in the
+    module's ``BATCHED_FUNCTIONS`` are timed with ``batched=True`` and,
+    if ``scalar`` is set, also with the slow ``batched=False`` reference path.
+
+    Tool modules list the functions that have both code paths in
+    ``BATCHED_FUNCTIONS``. These take a ``batched`` argument, which
+    defaults to the fast path (``batched=True``), while ``batched=False``
+    keeps the slow reference code (e.g. one call per position or observer).
+    """
+    if name not in getattr(module, 'BATCHED_FUNCTIONS', []):
+        return [('default', {})]
+
+    modes = [('batched', dict(batched=True))]
+    if scalar:
+        modes.append(('scalar', dict(batched=False)))
+    return modes
+
+
+def time_calls(func, args, kwargs=None, repeat=5, warmup=1):
+    """Time repeated calls of ``func(*args, **kwargs)``.
+
+    The first ``warmup`` calls are not timed, so that one-time setup costs
+    (imports, caches, data downloads) don't end up in the results.
+
+    Returns an array with the wall-clock duration (in sec) of each call.
+    """
+    kwargs = kwargs or {}
+
+    for _ in range(warmup):
+        func(*args, **kwargs)
+
+    durations = np.empty(repeat)
+    for ii in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        durations[ii] = time.perf_counter() - start
+
+    return durations
+
+
+def speed_stats(durations, n_coords):
+    """Summarize call durations into throughput and latency stats.
+
+    Latencies are given in milliseconds per call, throughput in
+    coordinates per second (using the median call duration).
+    """
+    latency = 1e3 * durations
+    stats = dict(n_coords=n_coords,
+                 repeat=len(durations),
+                 coords_per_sec=n_coords / np.median(durations),
+                 latency_min=np.min(latency),
+                 latency_max=np.max(latency),
+                 latency_std=np.std(latency))
+    for percentile, value in zip(PERCENTILES, np.percentile(latency, PERCENTILES)):
+        stats['latency_p{}'.format(percentile)] = value
+    return stats
+
+
+def profile_call(tool, name, func, args, kwargs):
+    """Profile one (untimed) call and write the results (see `profiling`)."""
+    profiler = cProfile.Profile()
+    with profiling.profiled(profiler):
+        func(*args, **kwargs)
+    profiling.write_profile(profiler, tool, 'speed_' + name)
+
+
+def speed_celestial(tool, module, positions, repeat, warmup, scalar=True, profile=False):
+    """Time `transform_celestial` for all supported conversions of one tool."""
+    rows = []
+    for systems in utils.CELESTIAL_CONVERSIONS:
+        if not utils.supports_systems(module, systems):
+            logging.debug('Skipping {}'.format(systems))
+            continue
+
+        for mode, kwargs in function_modes(module, 'transform_celestial', scalar):
+            logging.info('Timing `transform_celestial` ({}) for tool `{}`: {} -> {}'
+                         ''.format(mode, tool, systems['in'], systems['out']))
+            durations = time_calls(module.transform_celestial, (positions, systems), kwargs,
+                                   repeat=repeat, warmup=warmup)
+            if profile:
+                name = '{}_to_{}_{}'.format(systems['in'], systems['out'], mode)
+                profile_call(tool, name, module.transform_celestial, (positions, systems), kwargs)
+            row = dict(tool=tool, function='transform_celestial', mode=mode,
+                       system_in=systems['in'], system_out=systems['out'])
+            row.update(speed_stats(durations, len(positions)))
+            rows.append(row)
+
+    return rows
+
+
+def speed_horizontal(tool, module, positions, observers, repeat, warmup, scalar=True,
+                     profile=False):
+    """Time `convert_horizontal` for one tool."""
+    rows = []
+    for mode, kwargs in function_modes(module, 'convert_horizontal', scalar):
+        logging.info('Timing `convert_horizontal` ({}) for tool `{}`'.format(mode, tool))
+        durations = time_calls(module.convert_horizontal, (positions, observers), kwargs,
+                               repeat=repeat, warmup=warmup)
+        if profile:
+            name = 'fk5_to_horizontal_{}'.format(mode)
+            profile_call(tool, name, module.convert_horizontal, (positions, observers), kwargs)
+        row = dict(tool=tool, function='convert_horizontal', mode=mode,
+                   system_in='fk5', system_out='horizontal')
+        row.update(speed_stats(durations, len(positions) * len(observers)))
+        rows.append(row)
+
+    return rows
+
+
+def make_speed_table(rows):
+    """Make a table of speed results (one row per tool and conversion)."""
+    names = ['tool', 'function', 'mode', 'system_in', 'system_out', 'n_coords', 'repeat',
+             'coords_per_sec', 'latency_min']
+    names += ['latency_p{}'.format(_) for _ in PERCENTILES]
+    names += ['latency_max', 'latency_std']
+
+    table = Table(rows=[[row[name] for name in names] for row in rows], names=names)
+    table['coords_per_sec'].format = '%.4g'
+    for name in names:
+        if name.startswith('latency'):
+            table[name].format = '%.4f'
+            table[name].unit = 'ms'
+
+    return table
+
+
+def read_speed_table():
+    """Read the speed results as a dict of rows by (tool, system_in, system_out).
+
+    For batched functions the row of the batched code path is used.
+    Returns an empty dict if there are no results (see `benchmark_speed`).
+    """
+    filename = utils.speed_filename()
+    if not os.path.exists(filename):
+        return {}
+
+    logging.debug('Reading {}'.format(filename))
+    table = Table.read(filename, format=utils.TABLE_FORMAT)
+    return dict(((row['tool'], row['system_in'], row['system_out']), row)
+                for row in table if row['mode'] != 'scalar')
+
+
+@click.command(name='benchmark-speed')
+@click.option('--tools', default='all',
+              help='Which tools to benchmark.')
+@click.option('--repeat', default=5,
+              help='Number of timed calls per tool and conversion.')
+@click.option('--warmup', default=1,
+              help='Number of untimed calls before the timed ones.')
+@click.option('--horizontal-subset/--no-horizontal-subset', default=True,
+              help='Use the debug subset of positions and observers for `convert_horizontal`.')
+@click.option('--scalar/--no-scalar', default=True,
+              help='Also time the slow reference code path of batched functions.')
+@click.option('--profile', is_flag=True,
+              help='Also profile one extra call per conversion and write the results in `output/profiles`.')
+def benchmark_speed(tools, repeat, warmup, horizontal_subset, scalar, profile):
+    """Measure coordinate conversion throughput and latency."""
+    tools = utils.select_tools(tools)
+    positions = utils.get_positions()
+    horizontal_positions = utils.get_positions(use_subset=horizontal_subset)
+    observers = utils.get_observers(use_subset=horizontal_subset)
+
+    rows = []
+    for tool in tools:
+        module = utils.get_test_module(tool)
+        if profile:
+            profiling.clear_profiles(tool)
+
+        if hasattr(module, 'transform_celestial'):
+            rows += speed_celestial(tool, module, positions, repeat, warmup, scalar, profile)
+        else:
+            logging.warning('{} does not support `transform_celestial`'.format(tool))
+
+        if hasattr(module, 'convert_horizontal'):
+            rows += speed_horizontal(tool, module, horizontal_positions, observers,
+                                     repeat, warmup, scalar, profile)
+        else:
+            logging.warning('{} does not support `convert_horizontal`'.format(tool))
+
+    if profile and rows:
+        profiling.write_index()
+
+    if not rows:
+        logging.warning('No speed results to write.')
+        return
+
+    table = make_speed_table(rows)
+    utils.make_output_dir('')
+    filename = utils.speed_filename()
+    logging.info('Writing {}'.format(filename))
+    table.write(filename, format=utils.TABLE_FORMAT, overwrite=True)
@@ -0,0 +1,258 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Run benchmark tasks in isolated worker processes.
+
+A task is a tuple of arguments for a module-level function (so that it can be
+sent to a worker process), e.g. ``(tool, systems, positions)``.
+
+Each worker runs one task at a time. If a task hangs (``timeout``), uses too
+much memory (``memory_limit``) or crashes its worker (e.g. a segfault in a C
+extension), only that task fails: the worker is replaced by a new one and
+the remaining tasks still run.
+"""
+from __future__ import absolute_import, division, print_function
+
+import logging
+import collections
+import multiprocessing
+import multiprocessing.connection
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+LOG_FORMAT = '%(levelname)s: %(message)s'
+TASK_LOG_FORMAT = '%(levelname)s: [{}] %(message)s'
+
+
+def _set_log_format(fmt):
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(fmt))
+
+
+def _set_memory_limit(memory_limit):
+    """Limit the address space of the current process (in MB)."""
+    if memory_limit is None:
+        return
+
+    if resource is None:
+        logging.warning('Memory limit not supported on this platform.')
+        return
+
+    limit = int(memory_limit * 1024 ** 2)
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _run_task(args):
+    """Run one task and catch errors, so that one failure doesn't stop the others."""
+    func, task, label, in_worker = args
+
+    if in_worker:
+        # Prefix log messages with the task, since output of workers interleaves
+        _set_log_format(TASK_LOG_FORMAT.format(label))
+
+    try:
+        return func(*task), None
+    except Exception:
+        return None, traceback.format_exc()
+    finally:
+        if in_worker:
+            _set_log_format(LOG_FORMAT)
+
+
+def _worker_loop(conn, memory_limit):
+    """Run tasks received on ``conn`` until ``None`` is received."""
+    _set_memory_limit(memory_limit)
+
+    while True:
+        try:
+            item = conn.recv()
+        except EOFError:
+            break
+
+        if item is None:
+            break
+
+        index, args = item
+        conn.send((index, _run_task(args)))
+
+
+class _Worker(object):
+    """A worker process, which runs one task at a time."""
+
+    def __init__(self, memory_limit=None):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_loop,
+                                               args=(child_conn, memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+        # Index and start time of the running task
+        self.index = None
+        self.start = None
+
+    def submit(self, index, args):
+        self.index = index
+        self.start = time.monotonic()
+        self.conn.send((index, args))
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+
+
+def _run_isolated(args, jobs, timeout=None, memory_limit=None, fresh=False):
+    """Run tasks in ``jobs`` worker processes.
+
+    Yields ``(index, (result, error))`` for each task as soon as it is done.
+    With ``fresh=True`` each task runs in a new worker process.
+    """
+    pending = collections.deque(enumerate(args))
+    workers = [_Worker(memory_limit) for _ in range(min(jobs, len(pending)))]
+
+    def submit_next(worker):
+        worker.index = None
+        if pending:
+            worker.submit(*pending.popleft())
+
+    try:
+        for worker in workers:
+            submit_next(worker)
+
+        while any(worker.index is not None for worker in workers):
+            busy = [worker for worker in workers if worker.index is not None]
+
+            wait_timeout = None
+            if timeout is not None:
+                deadline = min(worker.start for worker in busy) + timeout
+                wait_timeout = max(0, deadline - time.monotonic())
+
+            handles = [worker.conn for worker in busy] + [worker.process.sentinel for worker in busy]
+            ready = multiprocessing.connection.wait(handles, wait_timeout)
+
+            for ii, worker in enumerate(workers):
+                if worker.index is None:
+                    continue
+
+                index, outcome = worker.index, None
+                if worker.conn in ready:
+                    try:
+                        index, outcome = worker.conn.recv()
+                    except EOFError:
+                        pass
+
+                if outcome is None:
+                    if worker.conn in ready or worker.process.sentinel in ready:
+                        worker.process.join(1)
+                        error = 'Worker crashed (exit code {})'.format(worker.process.exitcode)
+                    elif timeout is not None and time.monotonic() - worker.start > timeout:
+                        error = 'Timed out after {} sec'.format(timeout)
+                    else:
+                        continue
+
+                    # Replace the worker, so that the remaining tasks still run
+                    outcome = None, error
+                    worker.kill()
+                    worker = workers[ii] = _Worker(memory_limit)
+                elif fresh and pending:
+                    worker.stop()
+                    worker = workers[ii] = _Worker(memory_limit)
+
+                yield index, outcome
+                submit_next(worker)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+def run_tasks(func, tasks, jobs=1, labels=None, callback=None, errback=None,
+              timeout=None, memory_limit=None, fresh=False):
+    """Call ``func(*task)`` for each task in ``tasks``.
+
+    Parameters
+    ----------
+    func : function
+        Module-level function to call.
+    tasks : list of tuple
+        Arguments for each call.
+    jobs : int
+        Number of worker processes. With ``jobs=1`` and no ``timeout``
+        or ``memory_limit`` everything runs in the current process.
+    labels : list of str, optional
+        Task labels used in log messages (default: ``str(task)``).
+    callback : function, optional
+        Called in the main process as ``callback(task, result)``
+        for each task that succeeded, as soon as it is done.
+    errback : function, optional
+        Called in the main process as ``errback(task, error)``
+        for each task that failed, as soon as it is done.
+    timeout : float, optional
+        Wall-clock time limit per task (in sec).
+    memory_limit : float, optional
+        Address space limit per worker process (in MB).
+    fresh : bool
+        Run each task in a new worker process (also with ``jobs=1``),
+        e.g. so that its peak memory use can be measured.
+
+    Returns
+    -------
+    results : list
+        Return value of each call, in task order (``None`` for failed tasks).
+
+    Raises
+    ------
+    RuntimeError
+        If any task failed. All other tasks are still run first,
+        and the error of each failed task is logged.
+    """
+    tasks = list(tasks)
+    if labels is None:
+        labels = [str(task) for task in tasks]
+
+    isolated = jobs > 1 or timeout is not None or memory_limit is not None or fresh
+    isolated = isolated and len(tasks) > 0
+    args = [(func, task, label, isolated) for task, label in zip(tasks, labels)]
+
+    results = [None] * len(tasks)
+
+    def _collect(outcomes):
+        n_failed = 0
+        for index, (result, error) in outcomes:
+            task, label = tasks[index], labels[index]
+            if error is not None:
+                n_failed += 1
+                logging.error('Task {} failed:\n{}'.format(label, error))
+                if errback is not None:
+                    errback(task, error)
+            elif callback is not None:
+                callback(task, result)
+            results[index] = result
+        return n_failed
+
+    if isolated:
+        logging.info('Running {} tasks in {} worker processes'.format(len(tasks), jobs))
+        n_failed = _collect(_run_isolated(args, jobs, timeout, memory_limit, fresh))
+    else:
+        n_failed = _collect(enumerate(_run_task(_) for _ in args))
+
+    if n_failed:
+        raise RuntimeError('{} of {} tasks failed'.format(n_failed, len(tasks)))
+
+    return results
@@ -0,0 +1,185 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Profile tool calls with `cProfile`.
+
+For each profiled task two files are written in ``output/profiles/<tool>``:
+
+* ``<name>.pstats`` -- `pstats` file, e.g. for ``python -m pstats`` or snakeviz
+* ``<name>.collapsed.txt`` -- collapsed stacks, e.g. for ``flamegraph.pl``
+
+`write_index` lists the top functions (by cumulative time) for each tool.
+The profiles of a tool are removed at the start of each profiled run
+(see `clear_profiles`), so that the index only sums up the profiles of one run.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import glob
+import shutil
+import logging
+import collections
+import contextlib
+import html
+import pstats
+from . import utils
+
+# Number of functions listed per tool in the HTML index
+N_TOP = 20
+
+# Stack paths with less than this fraction of the total time are left out of the collapsed stacks
+MIN_PATH_FRACTION = 1e-4
+
+# Maximum depth of the collapsed stacks
+MAX_DEPTH = 100
+
+
+def _function_label(func):
+    """Label for a `pstats` function key ``(filename, line, name)``."""
+    filename, line, name = func
+    if filename == '~':
+        # Built-in function
+        label = name
+    else:
+        label = '{} ({}:{})'.format(name, os.path.basename(filename), line)
+    return label.replace(';', ',')
+
+
+def collapse_stacks(stats):
+    """Convert `pstats.Stats` to collapsed stacks (``{"a;b;c": time}``, time in sec).
+
+    cProfile only records caller -> callee edges, not full stacks, so the time
+    of each function is split over its callers in proportion to the time
+    spent in it from each caller.
+    """
+    stats = stats.stats
+
+    callees = collections.defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+
+    stacks = collections.Counter()
+
+    roots = [func for func, value in stats.items() if not value[4]]
+    min_path_time = MIN_PATH_FRACTION * sum(stats[root][3] for root in roots)
+
+    def visit(func, path, path_time):
+        _, _, own_time, total_time, _ = stats[func]
+        if total_time <= 0:
+            return
+
+        fraction = path_time / total_time
+        path = path + (func,)
+        stacks[';'.join(_function_label(_) for _ in path)] += own_time * fraction
+
+        if len(path) >= MAX_DEPTH:
+            return
+
+        for callee, edge_time in callees[func].items():
+            callee_time = edge_time * fraction
+            # Skip recursion and paths that don't matter
+            if callee not in path and callee_time >= min_path_time:
+                visit(callee, path, callee_time)
+
+    for root in roots:
+        visit(root, (), stats[root][3])
+
+    return stacks
+
+
+@contextlib.contextmanager
+def profiled(profiler):
+    """Profile a ``with`` block with ``profiler`` (a `cProfile.Profile`, or `None` to not profile).
+
+    `cProfile.Profile` itself is only a context manager from Python 3.8 on.
+    """
+    if profiler is None:
+        yield
+        return
+
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+
+def clear_profiles(tool):
+    """Remove the profiles of earlier runs for one tool."""
+    profiles_dir = utils.profiles_dir(tool)
+    if os.path.exists(profiles_dir):
+        logging.info('Removing stale profiles in {}'.format(profiles_dir))
+        shutil.rmtree(profiles_dir)
+
+
+def write_profile(profiler, tool, name):
+    """Write the ``.pstats`` and collapsed stacks files of a `cProfile.Profile`."""
+    utils.make_output_dir(os.path.join('profiles', tool))
+
+    filename = utils.profile_filename(tool, name, '.pstats')
+    logging.info('Writing {}'.format(filename))
+    profiler.dump_stats(filename)
+
+    stacks = collapse_stacks(pstats.Stats(filename))
+    filename = utils.profile_filename(tool, name, '.collapsed.txt')
+    logging.info('Writing {}'.format(filename))
+    with open(filename, 'w') as fh:
+        for stack, time in sorted(stacks.items()):
+            # Flame graph tools expect integer counts, use microseconds
+            count = int(round(1e6 * time))
+            if count > 0:
+                fh.write('{} {}\n'.format(stack, count))
+
+
+def _top_functions(filenames, n_top=N_TOP):
+    """Top functions by cumulative time, summed over several profiles."""
+    stats = pstats.Stats(*filenames)
+    rows = []
+    for func, (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append(dict(function=html.escape(_function_label(func)),
+                         ncalls=nc, tottime=tt, cumtime=ct))
+    rows.sort(key=lambda row: row['cumtime'], reverse=True)
+    return rows[:n_top]
+
+
+def write_index():
+    """Write an HTML page with the top cumulative functions for each tool."""
+    filename = utils.profile_index_filename()
+    profiles_dir = os.path.dirname(filename)
+    tools = sorted(_ for _ in os.listdir(profiles_dir)
+                   if os.path.isdir(os.path.join(profiles_dir, _)))
+
+    fh = open(filename, 'w')
+    fh.write("<html>\n")
+    fh.write("   <head>\n")
+    fh.write("      <link href='../style.css' rel='stylesheet' type='text/css'\n")
+    fh.write("   </head>\n")
+    fh.write("   <body>\n")
+    fh.write("      <p align='center'>Top {} functions by cumulative time (in sec) for each tool</p>\n".format(N_TOP))
+
+    for tool in tools:
+        pstats_filenames = sorted(glob.glob(os.path.join(profiles_dir, tool, '*.pstats')))
+        if not pstats_filenames:
+            continue
+
+        fh.write('<a name="{0}"></a><a class="anchor" href="#{0}"><h2>{0}</h2></a>\n'.format(tool))
+        fh.write("<table align='center'>\n")
+        fh.write("  <tr><th>Function</th><th width=80>Calls</th>"
+                 "<th width=80>Own time</th><th width=80>Cum. time</th></tr>\n")
+        for row in _top_functions(pstats_filenames):
+            fh.write("  <tr><td>{function}</td><td align='right'>{ncalls}</td>"
+                     "<td align='right'>{tottime:.4f}</td><td align='right'>{cumtime:.4f}</td></tr>\n"
+                     "".format(**row))
+        fh.write("</table>\n")
+
+        fh.write("<p align='center'>\n")
+        for pstats_filename in pstats_filenames:
+            name = os.path.basename(pstats_filename)[:-len('.pstats')]
+            fh.write("<a href='{0}/{1}.pstats'>{1}.pstats</a> "
+                     "<a href='{0}/{1}.collapsed.txt'>(collapsed)</a><br>\n".format(tool, name))
+        fh.write("</p>\n")
+
+    fh.write("   </body>\n")
+    fh.write("</html>\n")
+    fh.close()
+
+    logging.info('Writing {}'.format(filename))
@@ -0,0 +1,108 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Separation statistics for all tool pairs and conversions.
+
+For each conversion the separations are computed one tool pair at a time,
+in chunks of positions (see `pair_separations`), so that memory use only
+grows with the number of positions N, not with N times the number of pairs.
+The summary stores the stats, together with speed and memory results,
+in ``output/summary_data.json``
+(see `~coordinates_benchmark.commands.html.make_summary_data`).
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import logging
+import numpy as np
+from astropy import units as u
+from . import utils
+from . import parallel
+
+RAD_TO_ARCSEC = u.rad.to(u.arcsec)
+
+STATS_NAMES = ['median', 'mean', 'max', 'std']
+
+STATS_DTYPE = [('tool1', 'U16'), ('tool2', 'U16'), ('system_in', 'U16'), ('system_out', 'U16')]
+STATS_DTYPE += [(name, 'f8') for name in STATS_NAMES]
+
+
+def load_results(tools, systems):
+    """Load the (memory-mapped) results of all tools for one conversion.
+
+    Tools without results are left out.
+    Returns ``(tools, results)`` with one `~astropy.table.Table` per tool.
+    """
+    available, results = [], []
+    for tool in tools:
+        if not os.path.exists(utils.celestial_filename(tool, systems)):
+            logging.debug('No results for {}'.format(utils.task_label(tool, systems)))
+            continue
+        available.append(tool)
+        results.append(utils.celestial_results(tool, systems))
+
+    return available, results
+
+
+def pair_separations(results1, results2, chunk_size=utils.CHUNK_SIZE):
+    """Separations (in arcsec) between the results of two tools.
+
+    Uses the same (Vincenty) formula as `astropy.coordinates.angular_separation`.
+    Positions are processed in chunks of ``chunk_size``, so that the
+    temporary arrays don't take more memory than the separations themselves.
+    """
+    separation = np.empty(len(results1))
+    for start in range(0, len(results1), chunk_size):
+        stop = start + chunk_size
+        lon1 = np.radians(results1['lon'][start:stop])
+        lat1 = np.radians(results1['lat'][start:stop])
+        lon2 = np.radians(results2['lon'][start:stop])
+        lat2 = np.radians(results2['lat'][start:stop])
+
+        sin_lat1, cos_lat1 = np.sin(lat1), np.cos(lat1)
+        sin_lat2, cos_lat2 = np.sin(lat2), np.cos(lat2)
+        dlon = lon2 - lon1
+        sin_dlon, cos_dlon = np.sin(dlon), np.cos(dlon)
+
+        num1 = cos_lat2 * sin_dlon
+        num2 = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_dlon
+        denominator = sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_dlon
+
+        separation[start:stop] = RAD_TO_ARCSEC * np.arctan2(np.hypot(num1, num2), denominator)
+
+    return separation
+
+
+def conversion_stats(systems, tools=None):
+    """Separation stats (in arcsec) for all tool pairs of one conversion.
+
+    Returns a structured array with one row per tool pair with results.
+    """
+    tools = utils.TOOLS if tools is None else tools
+    tools, results = load_results(sorted(tools), systems)
+
+    idx1, idx2 = np.triu_indices(len(tools), k=1)
+
+    stats = np.zeros(len(idx1), dtype=STATS_DTYPE)
+    stats['system_in'] = systems['in']
+    stats['system_out'] = systems['out']
+    for row, i, j in zip(stats, idx1, idx2):
+        separation = pair_separations(results[i], results[j])
+        row['tool1'] = tools[i]
+        row['tool2'] = tools[j]
+        row['median'] = np.median(separation)
+        row['mean'] = np.mean(separation)
+        row['max'] = np.max(separation)
+        row['std'] = np.std(separation)
+
+    return stats
+
+
+def compute_stats(tools=None, jobs=1):
+    """Compute stats for all conversions (one task per conversion)."""
+    tasks = [(systems, tools) for systems in utils.CELESTIAL_CONVERSIONS]
+    labels = [utils.task_label('stats', systems) for systems in utils.CELESTIAL_CONVERSIONS]
+
+    logging.info('Computing stats for {} conversions'.format(len(tasks)))
+    results = parallel.run_tasks(conversion_stats, tasks, jobs=jobs, labels=labels)
+
+    return np.concatenate(results)
+
@@ -6,6 +6,7 @@ http://www.astropy.org
 """
 from __future__ import absolute_import, division, print_function
 
+import numpy as np
 from astropy.table import Table
 from astropy.coordinates import Angle, EarthLocation, AltAz, SkyCoord
 from astropy import coordinates as coord
@@ -14,6 +15,8 @@ from astropy import units as u
 
 SUPPORTED_SYSTEMS = 'fk5 fk4 icrs galactic ecliptic'.split()
 
+BATCHED_FUNCTIONS = ['convert_horizontal']
+
 
 def get_system(system):
     """Convert generic system specification tags to astropy specific class."""
@@ -77,7 +80,39 @@ def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
     return dict(az=az, alt=alt)
 
 
-def convert_horizontal(positions, observers):
+def _convert_horizontal_batched(positions, observers):
+    """Convert all positions for all observers with one `transform_to` call.
+
+    Observers are put on the first and positions on the second axis,
+    so that the flattened results are in the same order (observer-major)
+    as for the per-position loop in `convert_horizontal`.
+    """
+    radec = SkyCoord(positions['lon'], positions['lat'], unit='deg')
+
+    location = EarthLocation(lon=Angle(observers['lon'], 'deg'),
+                             lat=Angle(observers['lat'], 'deg'),
+                             height=observers['height'] * u.km)
+    obstime = Time(observers['time'], scale='utc')
+    altaz_frame = AltAz(obstime=obstime[:, np.newaxis],
+                        location=location[:, np.newaxis])
+
+    altaz = radec.transform_to(altaz_frame)
+
+    out = Table()
+    out['az'] = altaz.az.deg.ravel()
+    out['alt'] = altaz.alt.deg.ravel()
+    return out
+
+
+def convert_horizontal(positions, observers, batched=True):
+    """Convert positions to horizontal coordinates for each observer.
+
+    By default all positions and observers are converted at once
+    (see `_convert_horizontal_batched`), which gives identical results
+    to converting one position at a time with ``batched=False``.
+    """
+    if batched:
+        return _convert_horizontal_batched(positions, observers)
 
     results = []
     for observer in observers:
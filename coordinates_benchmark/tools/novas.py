@@ -16,27 +16,138 @@ T0 = 2451545.00000000
 
 SUPPORTED_SYSTEMS = 'icrs fk5 ecliptic'.split()
 
+BATCHED_FUNCTIONS = ['transform_celestial']
 
-def transform_celestial(coords, systems):
-    rav = coords['lon'] / 15.0
-    decv = coords['lat']
-    plist = [novas.radec2vector(ra, dec, 1.0) for ra, dec in zip(rav, decv)]
-
-    if systems['in'] == 'icrs':
-        pass
-    elif systems['in'] == 'fk5':
-        plist = [novas.frame_tie(position, -1) for position in plist]
-    elif systems['in'] == 'ecliptic':
-        plist = [novas.ecl2equ_vec(T0, position, 2) for position in plist]
-
-    if systems['out'] == 'icrs':
-        pass
-    elif systems['out'] == 'fk5':
-        plist = [novas.frame_tie(position, 0) for position in plist]
-    elif systems['out'] == 'ecliptic':
-        plist = [novas.equ2ecl_vec(T0, position, 2) for position in plist]
-
-    ra, dec = np.array([novas.vector2radec(position) for position in plist]).T
+# Number of positions checked against the scalar NOVAS calls (once per conversion)
+CHECK_SAMPLE_SIZE = 100
+
+# Maximum allowed difference to the scalar NOVAS calls (deg)
+CHECK_TOLERANCE = 1e-10
+
+# Rotation matrices to and from ICRS, computed once, by ``(direction, system)``
+_MATRICES = {}
+
+# Conversions already checked against the scalar NOVAS calls, as ``(in, out)`` systems
+_CHECKED = set()
+
+
+def _to_icrs(position, system):
+    """Rotate one 3-vector from ``system`` to ICRS with NOVAS."""
+    if system == 'fk5':
+        return novas.frame_tie(position, -1)
+    elif system == 'ecliptic':
+        return novas.ecl2equ_vec(T0, position, 2)
+    return position
+
+
+def _from_icrs(position, system):
+    """Rotate one 3-vector from ICRS to ``system`` with NOVAS."""
+    if system == 'fk5':
+        return novas.frame_tie(position, 0)
+    elif system == 'ecliptic':
+        return novas.equ2ecl_vec(T0, position, 2)
+    return position
+
+
+def get_matrix(direction, system):
+    """Rotation matrix to (``direction='to'``) or from (``'from'``) ICRS, taken once from NOVAS.
+
+    The frame tie and the J2000 ecliptic rotation are linear, so the matrix
+    columns are the NOVAS transforms of the unit vectors.
+    """
+    key = direction, system
+    if key not in _MATRICES:
+        func = _to_icrs if direction == 'to' else _from_icrs
+        columns = [func(list(unit), system) for unit in np.eye(3)]
+        _MATRICES[key] = np.array(columns).T
+    return _MATRICES[key]
+
+
+def _radec_to_vectors(ra, dec):
+    """Unit vectors (N, 3) for RA (hours) and Dec (deg), like `radec2vector`."""
+    ra, dec = np.radians(15.0 * ra), np.radians(dec)
+    return np.column_stack([np.cos(dec) * np.cos(ra),
+                            np.cos(dec) * np.sin(ra),
+                            np.sin(dec)])
+
+
+def _vectors_to_radec(vectors):
+    """RA (hours) and Dec (deg) for vectors (N, 3), like `vector2radec`."""
+    x, y, z = vectors.T
+    ra = np.degrees(np.arctan2(y, x)) / 15.0 % 24.0
+    dec = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    return ra, dec
+
+
+def _transform_scalar(ra, dec, systems):
+    """Convert positions with one NOVAS call per position and step."""
+    if not len(ra):
+        # `np.array([]).T` can't be unpacked into RA and Dec
+        return np.empty(0), np.empty(0)
+
+    plist = [novas.radec2vector(ra_, dec_, 1.0) for ra_, dec_ in zip(ra, dec)]
+    plist = [_to_icrs(position, systems['in']) for position in plist]
+    plist = [_from_icrs(position, systems['out']) for position in plist]
+    return np.array([novas.vector2radec(position) for position in plist]).T
+
+
+def _check_sample(ra, dec, out_ra, out_dec, systems):
+    """Compare batched results for a sample of positions with the scalar NOVAS calls."""
+    idx = np.linspace(0, len(ra) - 1, min(CHECK_SAMPLE_SIZE, len(ra))).astype(int)
+    ref_ra, ref_dec = _transform_scalar(ra[idx], dec[idx], systems)
+
+    # Compare RA on the sphere, so that the wrap at 24h doesn't matter
+    d_ra = (15.0 * (out_ra[idx] - ref_ra) + 180) % 360 - 180
+    diff = np.max(np.hypot(d_ra * np.cos(np.radians(ref_dec)), out_dec[idx] - ref_dec))
+    if diff > CHECK_TOLERANCE:
+        raise RuntimeError('NOVAS matrix conversion {} -> {} differs from scalar calls by {} deg'
+                           ''.format(systems['in'], systems['out'], diff))
+
+
+def transform_celestial_many(coords, in_system, out_systems):
+    """Convert positions from one celestial system to several others.
+
+    Positions are kept as an (N, 3) array and rotated to ICRS once, then
+    from ICRS to each output system, with matrices taken once from NOVAS.
+    Each conversion is checked against the scalar NOVAS calls on a sample
+    of positions on first use. Returns a dict of tables by output system.
+    """
+    rav = np.asarray(coords['lon'], dtype='float64') / 15.0
+    decv = np.asarray(coords['lat'], dtype='float64')
+
+    vectors = _radec_to_vectors(rav, decv).dot(get_matrix('to', in_system).T)
+
+    results = dict()
+    for out_system in out_systems:
+        systems = dict(zip(['in', 'out'], [in_system, out_system]))
+        ra, dec = _vectors_to_radec(vectors.dot(get_matrix('from', out_system).T))
+
+        key = in_system, out_system
+        if key not in _CHECKED and len(rav) > 0:
+            _check_sample(rav, decv, ra, dec, systems)
+            _CHECKED.add(key)
+
+        out = Table()
+        out['lon'] = ra * 15.0
+        out['lat'] = dec
+        results[out_system] = out
+
+    return results
+
+
+def transform_celestial(coords, systems, batched=True):
+    """Convert positions from one celestial system to another.
+
+    By default `transform_celestial_many` is used (rotation matrices taken
+    once from NOVAS). With ``batched=False`` each position is passed
+    through the NOVAS functions one at a time.
+    """
+    if batched:
+        return transform_celestial_many(coords, systems['in'], [systems['out']])[systems['out']]
+
+    rav = np.asarray(coords['lon'], dtype='float64') / 15.0
+    decv = np.asarray(coords['lat'], dtype='float64')
+    ra, dec = _transform_scalar(rav, decv, systems)
 
     out = Table()
     out['lon'] = ra * 15.0
@@ -0,0 +1,165 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""Reference conversions with rotation matrices in pure NumPy.
+
+All static J2000 conversions are rotations, so each one is done with
+a single precomputed 3x3 matrix and one matrix product for all positions.
+This gives a speed ceiling for the other tools.
+
+The system definitions follow SLALIB:
+
+* icrs -> fk5: Hipparcos frame orientation at epoch J2000 (``sla_HFK5Z``)
+* fk5 -> galactic: IAU 1958 galactic pole and origin (``sla_EQGAL``)
+* fk5 -> ecliptic: mean ecliptic and equinox of J2000, IAU 1976 obliquity
+* fk4 -> fk5: FK4 with e-terms, equinox B1950, assuming zero proper
+  motion in FK5 (``sla_FK45Z``)
+
+http://www.starlink.rl.ac.uk/docs/sun67.htx/sun67.html
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from astropy.table import Table
+
+SUPPORTED_SYSTEMS = 'fk5 fk4 icrs galactic ecliptic'.split()
+
+# Besselian epoch of J2000, which is the epoch of observation for FK4
+FK4_EPOCH = 2000.0012775136652
+
+# Number of iterations to invert the FK4 -> FK5 conversion
+FK4_ITERATIONS = 3
+
+# Radians per year to arcsec per tropical century
+_PMF = 100 * 60 * 60 * 360 / (2 * np.pi)
+
+_MAS_TO_RAD = np.radians(1e-3 / 3600)
+
+
+def _rotation_vector_to_matrix(vector):
+    """Rotation matrix for a rotation vector (like ``sla_DAV2M``)."""
+    angle = np.sqrt(np.sum(vector ** 2))
+    x, y, z = vector / angle
+    s, c = np.sin(angle), np.cos(angle)
+    f = 1 - c
+    return np.array([[x * x * f + c, x * y * f + z * s, x * z * f - y * s],
+                     [x * y * f - z * s, y * y * f + c, y * z * f + x * s],
+                     [x * z * f + y * s, y * z * f - x * s, z * z * f + c]])
+
+
+def _make_fk4_parameters(epoch):
+    """E-terms vector and FK4 -> FK5 matrix for a Besselian epoch (like ``sla_FK45Z``)."""
+    # E-terms of aberration, and their rate of change (arcsec per tropical century)
+    eterms = np.array([-1.62557e-6, -0.31919e-6, -0.13843e-6])
+    eterms_rate = np.array([+1.245e-3, -1.580e-3, -0.659e-3])
+
+    # FK4 -> FK5 position and velocity matrix (Standish 1982)
+    matrix = np.array([
+        [+0.9999256782, -0.0111820611, -0.0048579477],
+        [+0.0111820610, +0.9999374784, -0.0000271765],
+        [+0.0048579479, -0.0000271474, +0.9999881997],
+        [-0.000551, -0.238565, +0.435739],
+        [+0.238514, -0.002667, -0.008541],
+        [-0.435623, +0.012254, +0.002117],
+    ])
+
+    # Adjust the e-terms to give zero proper motion in FK5
+    eterms = eterms + (epoch - 1950) / _PMF * eterms_rate
+
+    # Allow for the fictitious proper motion in FK4
+    mjd = 15019.81352 + (epoch - 1900) * 365.242198781
+    years = (mjd - 51544.5) / 365.25
+    matrix = matrix[:3] + years / _PMF * matrix[3:]
+
+    return eterms, matrix
+
+
+def _make_matrices_from_fk5():
+    """Rotation matrices from FK5 J2000 to each system (except FK4)."""
+    icrs_orientation = np.array([-19.9, -9.1, 22.9]) * _MAS_TO_RAD
+
+    obliquity = np.radians(84381.448 / 3600)
+    c, s = np.cos(obliquity), np.sin(obliquity)
+
+    matrices = dict()
+    matrices['fk5'] = np.identity(3)
+    matrices['icrs'] = _rotation_vector_to_matrix(icrs_orientation)
+    matrices['galactic'] = np.array([
+        [-0.054875539726, -0.873437108010, -0.483834985808],
+        [+0.494109453312, -0.444829589425, +0.746982251810],
+        [-0.867666135858, -0.198076386122, +0.455983795705],
+    ])
+    matrices['ecliptic'] = np.array([[1, 0, 0], [0, c, s], [0, -s, c]])
+    return matrices
+
+
+FK4_ETERMS, FK4_TO_FK5 = _make_fk4_parameters(FK4_EPOCH)
+FK5_TO_FK4 = np.linalg.inv(FK4_TO_FK5)
+
+_FROM_FK5 = _make_matrices_from_fk5()
+
+
+def _make_matrix(system_in, system_out):
+    """Composite rotation matrix, with FK4 replaced by FK5 (see `transform_celestial`)."""
+    system_in = 'fk5' if system_in == 'fk4' else system_in
+    system_out = 'fk5' if system_out == 'fk4' else system_out
+    return _FROM_FK5[system_out].dot(_FROM_FK5[system_in].T)
+
+
+# Composite matrices for all conversions, by ``(in, out)`` systems
+MATRICES = dict(((system_in, system_out), _make_matrix(system_in, system_out))
+                for system_in in SUPPORTED_SYSTEMS for system_out in SUPPORTED_SYSTEMS)
+
+
+def _lonlat_to_vectors(lon, lat):
+    """Unit vectors (N, 3) for arrays of positions (in deg)."""
+    lon, lat = np.radians(lon), np.radians(lat)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _vectors_to_lonlat(vectors):
+    """Positions (in deg) for vectors (N, 3) of any length."""
+    x, y, z = vectors.T
+    lon = np.degrees(np.arctan2(y, x)) % 360
+    lat = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    return lon, lat
+
+
+def _fk4_to_fk5(vectors):
+    """Remove the e-terms and rotate FK4 vectors to FK5."""
+    w = vectors.dot(FK4_ETERMS)
+    vectors = vectors - FK4_ETERMS + w[:, np.newaxis] * vectors
+    return vectors.dot(FK4_TO_FK5.T)
+
+
+def _fk5_to_fk4(vectors):
+    """Inverse of `_fk4_to_fk5`, by iterating from the pure rotation."""
+    fk4_vectors = vectors.dot(FK5_TO_FK4.T)
+    for _ in range(FK4_ITERATIONS):
+        fk4_vectors += (vectors - _fk4_to_fk5(fk4_vectors)).dot(FK5_TO_FK4.T)
+    return fk4_vectors
+
+
+def transform_celestial(coords, systems):
+    """Convert positions from one celestial system to another.
+
+    Conversions between FK5, ICRS, galactic and ecliptic are a single
+    matrix product. For FK4 the e-terms are removed (added) before
+    (after) the rotation to (from) FK5.
+    """
+    vectors = _lonlat_to_vectors(coords['lon'], coords['lat'])
+
+    if systems['in'] == 'fk4':
+        vectors = _fk4_to_fk5(vectors)
+
+    vectors = vectors.dot(MATRICES[systems['in'], systems['out']].T)
+
+    if systems['out'] == 'fk4':
+        vectors = _fk5_to_fk4(vectors)
+
+    lon, lat = _vectors_to_lonlat(vectors)
+
+    out = Table()
+    out['lon'] = lon
+    out['lat'] = lat
+
+    return out
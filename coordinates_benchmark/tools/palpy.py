@@ -12,8 +12,64 @@ import palpy as pal
 
 SUPPORTED_SYSTEMS = 'fk5 fk4 icrs galactic ecliptic'.split()
 
+BATCHED_FUNCTIONS = ['transform_celestial']
+
+
+def _to_fk5_vector(lons, lats, system):
+    """Convert arrays of positions (in radians) to FK5 J2000 with the palpy vector functions."""
+    if system == 'fk4':
+        lons, lats = pal.fk45zVector(lons, lats, 2000.0012775136652)
+    elif system == 'icrs':
+        lons, lats = pal.hfk5zVector(lons, lats, 2000)[:2]
+    elif system == 'galactic':
+        lons, lats = pal.galeqVector(lons, lats)
+    elif system == 'ecliptic':
+        lons, lats = pal.ecleqVector(lons, lats, 51544)
+    return lons, lats
+
+
+def _from_fk5_vector(lons, lats, system):
+    """Convert arrays of positions (in radians) from FK5 J2000 with the palpy vector functions."""
+    if system == 'fk4':
+        lons, lats = pal.fk54zVector(lons, lats, 2000.0012775136652)[:2]
+    elif system == 'icrs':
+        lons, lats = pal.fk5hzVector(lons, lats, 2000)
+    elif system == 'galactic':
+        lons, lats = pal.eqgalVector(lons, lats)
+    elif system == 'ecliptic':
+        lons, lats = pal.eqeclVector(lons, lats, 51544)
+    return lons, lats
+
+
+def transform_celestial_many(coords, in_system, out_systems):
+    """Convert positions from one celestial system to several others.
+
+    The conversion to FK5 J2000 is only done once and shared by all outputs.
+    Returns a dict of tables by output system.
+    """
+    lons, lats = np.radians(coords['lon']), np.radians(coords['lat'])
+    lons, lats = _to_fk5_vector(lons, lats, in_system)
+
+    results = dict()
+    for out_system in out_systems:
+        out_lons, out_lats = _from_fk5_vector(lons, lats, out_system)
+        out = Table()
+        out['lon'] = np.degrees(out_lons)
+        out['lat'] = np.degrees(out_lats)
+        results[out_system] = out
+
+    return results
+
+
+def transform_celestial(coords, systems, batched=True):
+    """Convert positions from one celestial system to another.
+
+    By default the palpy vector functions are used; with ``batched=False``
+    the scalar functions are called once per position (same results).
+    """
+    if batched:
+        return transform_celestial_many(coords, systems['in'], [systems['out']])[systems['out']]
 
-def transform_celestial(coords, systems):
     lons, lats = np.radians(coords['lon']), np.radians(coords['lat'])
 
     out = Table()
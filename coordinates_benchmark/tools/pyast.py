@@ -15,6 +15,8 @@ from astropy.time import Time
 
 SUPPORTED_SYSTEMS = 'fk5 fk4 icrs galactic ecliptic'.split()
 
+BATCHED_FUNCTIONS = ['convert_horizontal']
+
 
 def get_frame(system):
     """Convert generic system specification tags to pyast.SkyFrame"""
@@ -44,7 +46,11 @@ def transform_celestial(coords, systems):
     out['lat'] = coords[:, 1]
     return out
 
-def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
+# FK5 to AZEL mappings, keyed by observer (lon, lat, height, time)
+_ALTAZ_MAPPINGS = {}
+
+
+def _make_altaz_mapping(lon, lat, height, time):
 
     # Convert supplied UTC date string to a UTC MJD.
     utc_frame = Ast.TimeFrame( 'TimeScale=UTC' )
@@ -68,15 +74,47 @@ def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
     azel_frame.ObsAlt = height*1000.0
 
     # Get the mapping from fk5 to azel.
-    mapping = fk5_frame.convert(azel_frame)
+    return fk5_frame.convert(azel_frame)
+
+
+def get_altaz_mapping(lon, lat, height, time):
+    """Get the FK5 to AZEL mapping for one observer.
+
+    Mappings only depend on the observer, so they are created once and re-used.
+    """
+    key = (lon, lat, height, time)
+    if key not in _ALTAZ_MAPPINGS:
+        _ALTAZ_MAPPINGS[key] = _make_altaz_mapping(lon, lat, height, time)
+    return _ALTAZ_MAPPINGS[key]
+
+
+def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
+    """Convert arrays of positions for a single observer."""
+    mapping = get_altaz_mapping(lon, lat, height, time)
 
     # Use it to transform the supplied (ra,dec) values to (az,el) values.
-    coords = mapping.tran([ [np.radians(ra)], [np.radians(dec)] ])
-    az = np.degrees( coords[0][0] )
-    el = np.degrees( coords[1][0] )
+    coords = mapping.tran([np.radians(ra), np.radians(dec)])
+    az = np.degrees( coords[0] )
+    el = np.degrees( coords[1] )
     return dict( az=az, alt=el )
 
-def convert_horizontal(positions, observers):
+
+def convert_horizontal(positions, observers, batched=True):
+    """Convert positions to horizontal coordinates for each observer.
+
+    By default all positions are transformed with one `tran` call per
+    observer; use ``batched=False`` to transform one position at a time.
+    """
+    if batched:
+        ra = np.asarray(positions['lon'])
+        dec = np.asarray(positions['lat'])
+        results = [_convert_radec_to_altaz(ra, dec, observer['lon'], observer['lat'],
+                                           observer['height'], observer['time'])
+                   for observer in observers]
+        out = Table()
+        out['az'] = np.concatenate([_['az'] for _ in results])
+        out['alt'] = np.concatenate([_['alt'] for _ in results])
+        return out
 
     results = []
     for observer in observers:
@@ -88,8 +126,8 @@ def convert_horizontal(positions, observers):
             lat = observer['lat']
             height = observer['height']
             time = observer['time']
-            altaz = _convert_radec_to_altaz(ra, dec, lon, lat, height, time)
-            results.append(altaz)
+            altaz = _convert_radec_to_altaz([ra], [dec], lon, lat, height, time)
+            results.append(dict(az=altaz['az'][0], alt=altaz['alt'][0]))
 
     out = Table(results)
     return out
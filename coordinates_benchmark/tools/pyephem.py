@@ -14,8 +14,85 @@ import ephem
 
 SUPPORTED_SYSTEMS = 'fk5 fk4 galactic ecliptic'.split()
 
+BATCHED_FUNCTIONS = ['transform_celestial', 'convert_horizontal']
+
+
+def _make_coord(lon, lat, system):
+    """Create a coordinate for one position (in radians)."""
+    if system == 'fk5':
+        return ephem.Equatorial(lon, lat)
+    elif system == 'fk4':
+        return ephem.Equatorial(lon, lat, epoch=ephem.B1950)
+    elif system == 'galactic':
+        return ephem.Galactic(lon, lat)
+    elif system == 'ecliptic':
+        return ephem.Ecliptic(lon, lat)
+    else:
+        raise ValueError()
+
+
+def _convert_coord(coord, system):
+    """Convert a coordinate to a system and return its (lon, lat) in radians."""
+    # Retrieving output system coordinates is system specific
+    # because the attribute names depend on the system
+    if system == 'fk5':
+        coord = ephem.Equatorial(coord, epoch=ephem.J2000)
+        return coord.ra, coord.dec
+    elif system == 'fk4':
+        coord = ephem.Equatorial(coord, epoch=ephem.B1950)
+        return coord.ra, coord.dec
+    elif system == 'galactic':
+        coord = ephem.Galactic(coord)
+        return coord.lon, coord.lat
+    elif system == 'ecliptic':
+        coord = ephem.Ecliptic(coord)
+        return coord.lon, coord.lat
+    else:
+        raise ValueError()
+
+
+def _transform_position(lon, lat, systems):
+    """Convert one position (in radians)."""
+    coord = _make_coord(lon, lat, systems['in'])
+    return _convert_coord(coord, systems['out'])
+
+
+def transform_celestial_many(coords, in_system, out_systems):
+    """Convert positions from one celestial system to several others.
+
+    The input coordinate object is only created once per position and
+    shared by all outputs. Returns a dict of tables by output system.
+    """
+    lons, lats = np.radians(coords['lon']), np.radians(coords['lat'])
+
+    out_lons = dict((system, np.empty(len(coords), dtype='float64')) for system in out_systems)
+    out_lats = dict((system, np.empty(len(coords), dtype='float64')) for system in out_systems)
+
+    for ii, (lon, lat) in enumerate(zip(lons, lats)):
+        coord = _make_coord(lon, lat, in_system)
+        for system in out_systems:
+            out_lons[system][ii], out_lats[system][ii] = _convert_coord(coord, system)
+
+    results = dict()
+    for system in out_systems:
+        out = Table()
+        out['lon'] = np.degrees(out_lons[system])
+        out['lat'] = np.degrees(out_lats[system])
+        results[system] = out
+
+    return results
+
+
+def transform_celestial(coords, systems, batched=True):
+    """Convert positions from one celestial system to another.
+
+    PyEphem converts one position at a time. By default results are
+    collected in NumPy arrays; with ``batched=False`` they are written
+    row by row into the output table instead, which is much slower.
+    """
+    if batched:
+        return transform_celestial_many(coords, systems['in'], [systems['out']])[systems['out']]
 
-def transform_celestial(coords, systems):
     lons, lats = np.radians(coords['lon']), np.radians(coords['lat'])
 
     out = Table()
@@ -23,42 +100,25 @@ def transform_celestial(coords, systems):
     out['lat'] = np.zeros(len(coords), dtype='float64')
 
     for ii, (lon, lat) in enumerate(zip(lons, lats)):
-        # Create coordinate in input system
-        if systems['in'] == 'fk5':
-            coord = ephem.Equatorial(lon, lat)
-        elif systems['in'] == 'fk4':
-            coord = ephem.Equatorial(lon, lat, epoch=ephem.B1950)
-        elif systems['in'] == 'galactic':
-            coord = ephem.Galactic(lon, lat)
-        elif systems['in'] == 'ecliptic':
-            coord = ephem.Ecliptic(lon, lat)
-        else:
-            raise ValueError()
-
-        # Convert to appropriate output system
-        # Retrieving output system coordinates is system specific
-        # because the attribute names depend on the system
-        if systems['out'] == 'fk5':
-            coord = ephem.Equatorial(coord, epoch=ephem.J2000)
-            lon, lat = coord.ra, coord.dec
-        elif systems['out'] == 'fk4':
-            coord = ephem.Equatorial(coord, epoch=ephem.B1950)
-            lon, lat = coord.ra, coord.dec
-        elif systems['out'] == 'galactic':
-            coord = ephem.Galactic(coord)
-            lon, lat = coord.lon, coord.lat
-        elif systems['out'] == 'ecliptic':
-            coord = ephem.Ecliptic(coord)
-            lon, lat = coord.lon, coord.lat
-        else:
-            raise ValueError()
-
+        lon, lat = _transform_position(lon, lat, systems)
         out[ii]['lon'] = np.degrees(lon)
         out[ii]['lat'] = np.degrees(lat)
 
     return out
 
 
+def _make_observer(lon, lat, height, time):
+    """Create a `ephem.Observer` with refraction turned off."""
+    obs = ephem.Observer()
+    obs.lon = np.radians(lon)
+    obs.lat = np.radians(lat)
+    obs.elevation = (height * u.km).to(u.m).value
+    obs.date = time
+    # Turn refraction off by setting pressure to zero
+    obs.pressure = 0
+    return obs
+
+
 def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
     """Convert a single position.
 
@@ -71,13 +131,7 @@ def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
     body._dec = np.radians(dec)
 
     # Set observer parameters
-    obs = ephem.Observer()
-    obs.lon = np.radians(lon)
-    obs.lat = np.radians(lat)
-    obs.elevation = (height * u.km).to(u.m).value
-    obs.date = time
-    # Turn refraction off by setting pressure to zero
-    obs.pressure = 0
+    obs = _make_observer(lon, lat, height, time)
 
     # Compute alt / az of the body for that observer
     body.compute(obs)
@@ -86,7 +140,35 @@ def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
     return dict(az=az, alt=alt)
 
 
-def convert_horizontal(positions, observers):
+def convert_horizontal(positions, observers, batched=True):
+    """Convert positions to horizontal coordinates for each observer.
+
+    By default one `ephem.Observer` and `ephem.FixedBody` are re-used
+    for all positions of an observer, and results are collected in NumPy
+    arrays. With ``batched=False`` new objects are made for each position.
+    """
+    if batched:
+        ras = np.radians(positions['lon'])
+        decs = np.radians(positions['lat'])
+        az = np.empty(len(observers) * len(positions), dtype='float64')
+        alt = np.empty_like(az)
+
+        body = ephem.FixedBody()
+        ii = 0
+        for observer in observers:
+            obs = _make_observer(observer['lon'], observer['lat'],
+                                 observer['height'], observer['time'])
+            for ra, dec in zip(ras, decs):
+                body._ra = ra
+                body._dec = dec
+                body.compute(obs)
+                az[ii], alt[ii] = body.az, body.alt
+                ii += 1
+
+        out = Table()
+        out['az'] = np.degrees(az)
+        out['alt'] = np.degrees(alt)
+        return out
 
     results = []
     for observer in observers:
@@ -12,8 +12,77 @@ from pyslalib import slalib
 
 SUPPORTED_SYSTEMS = 'fk5 fk4 icrs galactic ecliptic'.split()
 
+BATCHED_FUNCTIONS = ['transform_celestial']
+
+
+def _to_fk5_function(system):
+    """Scalar SLALIB function converting from ``system`` to FK5 J2000."""
+    if system == 'fk4':
+        return lambda lon, lat: slalib.sla_fk45z(lon, lat, 2000.0012775136652)
+    elif system == 'icrs':
+        return lambda lon, lat: slalib.sla_hfk5z(lon, lat, 2000)[:2]
+    elif system == 'galactic':
+        return slalib.sla_galeq
+    elif system == 'ecliptic':
+        return lambda lon, lat: slalib.sla_ecleq(lon, lat, 51544)
+
+
+def _from_fk5_function(system):
+    """Scalar SLALIB function converting from FK5 J2000 to ``system``."""
+    if system == 'fk4':
+        return lambda lon, lat: slalib.sla_fk54z(lon, lat, 2000.0012775136652)[:2]
+    elif system == 'icrs':
+        return lambda lon, lat: slalib.sla_fk5hz(lon, lat, 2000)
+    elif system == 'galactic':
+        return slalib.sla_eqgal
+    elif system == 'ecliptic':
+        return lambda lon, lat: slalib.sla_eqecl(lon, lat, 51544)
+
+
+def _apply(function, lons, lats):
+    """Apply a scalar function to arrays of positions."""
+    if function is None:
+        return lons, lats
+
+    out_lons = np.empty(len(lons), dtype='float64')
+    out_lats = np.empty(len(lats), dtype='float64')
+    for ii, (lon, lat) in enumerate(zip(lons, lats)):
+        out_lons[ii], out_lats[ii] = function(lon, lat)
+
+    return out_lons, out_lats
+
+
+def transform_celestial_many(coords, in_system, out_systems):
+    """Convert positions from one celestial system to several others.
+
+    The conversion to FK5 J2000 is only done once and shared by all outputs.
+    Returns a dict of tables by output system.
+    """
+    lons, lats = np.radians(coords['lon']), np.radians(coords['lat'])
+    lons, lats = _apply(_to_fk5_function(in_system), lons, lats)
+
+    results = dict()
+    for out_system in out_systems:
+        out_lons, out_lats = _apply(_from_fk5_function(out_system), lons, lats)
+        out = Table()
+        out['lon'] = np.degrees(out_lons)
+        out['lat'] = np.degrees(out_lats)
+        results[out_system] = out
+
+    return results
+
+
+def transform_celestial(coords, systems, batched=True):
+    """Convert positions from one celestial system to another.
+
+    SLALIB only has scalar routines, so by default all positions are first
+    converted to the FK5 J2000 hub and then to the output system, with
+    results collected in NumPy arrays. With ``batched=False`` each position
+    is converted in turn and written row by row (same results).
+    """
+    if batched:
+        return transform_celestial_many(coords, systems['in'], [systems['out']])[systems['out']]
 
-def transform_celestial(coords, systems):
     lons, lats = np.radians(coords['lon']), np.radians(coords['lat'])
 
     out = Table()
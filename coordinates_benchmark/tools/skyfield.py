@@ -7,6 +7,7 @@ https://rhodesmill.org/skyfield/
 """
 from __future__ import absolute_import, division, print_function
 
+import numpy as np
 from skyfield.units import Angle
 from skyfield.api import Star, wgs84, Loader
 from skyfield.data import iers
@@ -16,13 +17,29 @@ from astropy.table import Table
 
 EPHEMERIS = 'https://naif.jpl.nasa.gov/pub/naif/generic_kernels/spk/planets/de430.bsp'
 
+BATCHED_FUNCTIONS = ['convert_horizontal']
+
+# Loader, ephemeris and timescale (with IERS polar motion table) are expensive
+# to create, so we create them once per process and keep them here.
+_CACHE = {}
 
-def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
-    """Convert a single position.
 
-    This is done for easy code sharing with other tools.
-    Skyfield does support arrays of positions.
+def clear_cache():
+    """Forget the cached loader, ephemeris and timescale.
+
+    Call this to pick up new data files (e.g. an updated ``finals2000A.all``)
+    without starting a new process.
     """
+    _CACHE.clear()
+
+
+def _cached(key, factory):
+    if key not in _CACHE:
+        _CACHE[key] = factory()
+    return _CACHE[key]
+
+
+def _make_loader():
     load = Loader('.')
     # Skyfield uses FTP URLs, but FTP doesn't work on Github Actions so
     # we use alternative HTTP URLs.
@@ -30,26 +47,66 @@ def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
     load.urls['.bsp'] = [
         ('*.bsp', 'https://naif.jpl.nasa.gov/pub/naif/generic_kernels/spk/planets/')
     ]
+    return load
+
+
+def _make_timescale():
+    load = get_loader()
+    ts = load.timescale(builtin=False)
+    with load.open('finals2000A.all') as f:
+        finals_data = iers.parse_x_y_dut1_from_finals_all(f)
+    iers.install_polar_motion_table(ts, finals_data)
+    return ts
+
+
+def get_loader():
+    return _cached('loader', _make_loader)
 
+
+def get_ephemeris():
+    return _cached('ephemeris', lambda: get_loader()(EPHEMERIS))
+
+
+def get_timescale():
+    return _cached('timescale', _make_timescale)
+
+
+def _convert_radec_to_altaz(ra, dec, lon, lat, height, time):
+    """Convert positions for a single observer.
+
+    ``ra`` and ``dec`` can be scalars or arrays, since Skyfield supports
+    arrays of positions.
+    """
     radec = Star(ra=Angle(degrees=ra), dec=Angle(degrees=dec))
 
-    earth = load(EPHEMERIS)['earth']
+    earth = get_ephemeris()['earth']
     location = earth + wgs84.latlon(longitude_degrees=lon,
                                     latitude_degrees=lat,
                                     elevation_m=height * 1000.0)
 
-    ts = load.timescale(builtin=False)
-    with load.open('finals2000A.all') as f:
-        finals_data = iers.parse_x_y_dut1_from_finals_all(f)
-    iers.install_polar_motion_table(ts, finals_data)
-    obstime = ts.from_astropy(Time(time, scale='utc'))
+    obstime = get_timescale().from_astropy(Time(time, scale='utc'))
 
     alt, az, _ = location.at(obstime).observe(radec).apparent().altaz(pressure_mbar=0)
 
     return dict(az=az.degrees, alt=alt.degrees)
 
 
-def convert_horizontal(positions, observers):
+def convert_horizontal(positions, observers, batched=True):
+    """Convert positions to horizontal coordinates for each observer.
+
+    By default all positions are converted with one call per observer;
+    use ``batched=False`` to convert one position at a time.
+    """
+    if batched:
+        ra = np.asarray(positions['lon'])
+        dec = np.asarray(positions['lat'])
+        results = [_convert_radec_to_altaz(ra, dec, observer['lon'], observer['lat'],
+                                           observer['height'], observer['time'])
+                   for observer in observers]
+        out = Table()
+        out['az'] = np.concatenate([_['az'] for _ in results])
+        out['alt'] = np.concatenate([_['alt'] for _ in results])
+        return out
 
     results = []
     for observer in observers:
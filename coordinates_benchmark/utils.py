@@ -4,17 +4,38 @@
 from __future__ import absolute_import, division, print_function
 
 import os
+import io
 import logging
 import itertools
+import functools
+import sys
+import hashlib
+import json
+import importlib.util
 from importlib import import_module
 import numpy as np
 from astropy.table import Table
-from astropy.coordinates import Angle
 
+try:
+    from importlib import metadata as importlib_metadata
+except ImportError:
+    # Python < 3.8
+    import importlib_metadata
+
+# Inputs and results are stored as NumPy structured arrays in `.npy` files,
+# which are memory-mapped on read. The text format is an optional export.
+BINARY_EXTENSION = '.npy'
+TEXT_EXTENSION = '.txt'
 TABLE_FORMAT = 'ascii.fixed_width_two_line'
 FLOAT_FORMAT_OUTPUT = '%15.10f'   # For output tables
 FLOAT_FORMAT_INPUT = '%20.15f'  # for input tables
 
+# Max. number of memory-mapped result files (and file hashes) kept open
+CACHE_SIZE = 128
+
+# Default number of positions generated and converted at once
+CHUNK_SIZE = 1000000
+
 
 # Make a list of celestial conversions to check
 # We simply list all possible combinations here,
@@ -25,7 +46,7 @@ CELESTIAL_CONVERSIONS = [dict(zip(['in', 'out'], _))
                          for _ in CELESTIAL_CONVERSIONS
                          if _[0] != _[1]]
 
-TOOLS = sorted('astropy kapteyn novas pyast palpy pyephem pyslalib pytpm skyfield'.split())
+TOOLS = sorted('astropy kapteyn novas numpy_ref pyast palpy pyephem pyslalib pytpm skyfield'.split())
 TOOL_PAIRS = [_ for _ in itertools.product(TOOLS, TOOLS)
               if _[0] < _[1]]
 
@@ -35,11 +56,30 @@ def _import_name(name):
         return 'starlink.Ast'
     elif name == 'pyephem':
         return 'ephem'
+    elif name == 'numpy_ref':
+        return 'numpy'
+    else:
+        return name
+
+
+def _distribution_name(name):
+    """Name of the installed package (used to look up its version)."""
+    if name == 'pyast':
+        return 'starlink-pyast'
+    elif name == 'pyephem':
+        return 'ephem'
+    elif name == 'numpy_ref':
+        return 'numpy'
     else:
         return name
 
 
 def _tool_check():
+    """Check which tools are available and their version.
+
+    This only looks for the tool packages and their metadata, i.e. the tools
+    are not imported (which is slow), see `get_test_module` for that.
+    """
     tools = Table()
     tools['tool_name'] = TOOLS
     tools['import_name'] = [_import_name(_) for _ in TOOLS]
@@ -49,30 +89,119 @@ def _tool_check():
 
     for tool in tools:
         try:
-            module = import_module(tool['import_name'])
-            tool['available'] = True
-            try:
-                version = module.__version__
-                tool['version'] = version
-            except AttributeError:
-                pass
-        except ImportError:
+            spec = importlib.util.find_spec(tool['import_name'])
+        except (ImportError, ValueError):
+            spec = None
+
+        if spec is None:
+            continue
+
+        tool['available'] = True
+        try:
+            tool['version'] = importlib_metadata.version(_distribution_name(tool['tool_name']))
+        except importlib_metadata.PackageNotFoundError:
             pass
 
     return tools
 
-# Table with tools are available and what their version is
-TOOL_INFO = _tool_check()
+
+def _environment_key():
+    """Hash identifying the Python environment and the tools to check.
+
+    It changes when packages are installed, upgraded or removed,
+    because that changes the modification time of their directory.
+    It also changes when tools are added or their package names change,
+    i.e. when this module changes (see `_tool_check`).
+    """
+    paths = []
+    for path in sys.path:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        paths.append([path, mtime])
+
+    tools = [[tool, _import_name(tool), _distribution_name(tool)] for tool in TOOLS]
+    key = [sys.executable, sys.version, paths, tools, file_hash(__file__)]
+    return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+def tool_info_cache_filename():
+    cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_dir, 'coordinates-benchmark', 'tool_info.json')
+
+
+def _read_tool_info_cache(key):
+    filename = tool_info_cache_filename()
+    try:
+        with open(filename) as fh:
+            cache = json.load(fh)
+    except (IOError, ValueError):
+        return None
+
+    if cache.get('key') != key:
+        return None
+
+    logging.debug('Reading {}'.format(filename))
+    return Table(cache['tools'], names=cache['names'])
+
+
+def _write_tool_info_cache(key, tools):
+    filename = tool_info_cache_filename()
+    cache = dict(key=key, names=tools.colnames,
+                 tools=[[tool[name].item() for tool in tools] for name in tools.colnames])
+    try:
+        if not os.path.exists(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as fh:
+            json.dump(cache, fh)
+    except (IOError, OSError) as exc:
+        logging.debug('Could not write tool info cache: {}'.format(exc))
+
+
+_TOOL_INFO = None
+
+
+def get_tool_info(refresh=False):
+    """Table with tools are available and what their version is.
+
+    The table is cached on disk for the current Python environment.
+    Use ``refresh=True`` to check the tools again anyway.
+    """
+    global _TOOL_INFO
+
+    if _TOOL_INFO is None or refresh:
+        key = _environment_key()
+        tools = None if refresh else _read_tool_info_cache(key)
+        if tools is None:
+            tools = _tool_check()
+            _write_tool_info_cache(key, tools)
+        _TOOL_INFO = tools
+
+    return _TOOL_INFO
+
+
+def __getattr__(name):
+    # `TOOL_INFO` used to be computed on import, now it is only computed on access
+    if name == 'TOOL_INFO':
+        return get_tool_info()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def available_tools():
+    """List of tools that are available."""
+    tool_info = get_tool_info()
+    return list(tool_info['tool_name'][tool_info['available']])
 
 
 def select_tools(tools, include_idl=False):
     """Select the sub-set of requested and available tools."""
-    all = list(TOOL_INFO['tool_name'])
+    all = list(get_tool_info()['tool_name'])
 
     if include_idl:
         all.add_row(['idl', True, 'N/A'])
 
-    available = TOOL_INFO['tool_name'][TOOL_INFO['available']]
+    available = available_tools()
 
     requested = tools.split(',')
 
@@ -87,11 +216,171 @@ def select_tools(tools, include_idl=False):
     return sorted(requested)
 
 
-def get_observers(use_subset=False):
-    filename = 'input/observers.txt'
+def text_filename(filename):
+    """Text export filename for a `.npy` table filename."""
+    return os.path.splitext(filename)[0] + TEXT_EXTENSION
+
+
+def write_table(table, filename, text=False):
+    """Write a table to a `.npy` file.
+
+    With ``text=True`` it is also exported in ``TABLE_FORMAT``
+    to a `.txt` file next to it, using the column formats set on the table.
+    """
+    logging.info('Writing {}'.format(filename))
+    np.save(filename, table.as_array())
+
+    if text:
+        filename = text_filename(filename)
+        logging.info('Writing {}'.format(filename))
+        table.write(filename, format=TABLE_FORMAT, overwrite=True)
+
+
+def _temp_filename(filename):
+    """Temporary filename used while writing ``filename`` (see `TableChunkWriter`)."""
+    return filename + '.part'
+
+
+def iter_chunks(table, chunk_size=CHUNK_SIZE):
+    """Iterate over consecutive slices of at most ``chunk_size`` rows of a table."""
+    for start in range(0, len(table), chunk_size):
+        yield table[start:start + chunk_size]
+
+
+class TableChunkWriter(object):
+    """Write a table to a `.npy` file one chunk at a time.
+
+    Use this instead of `write_table_chunks` to write several tables in
+    the same loop. Memory use only depends on the chunk size, not on the
+    total number of rows ``n_rows``. With ``text=True`` the table is also
+    exported like in `write_table`.
+
+    Chunks are written to temporary files, which only replace ``filename``
+    (and its text export) once all ``n_rows`` rows were written, so that
+    a failed run doesn't overwrite earlier results.
+    """
+
+    def __init__(self, filename, n_rows, text=False):
+        logging.info('Writing {}'.format(filename))
+        self.filename = filename
+        self.n_rows = n_rows
+        self.start = 0
+        self.array = None
+        self.filenames = {_temp_filename(filename): filename}
+        self.text_fh = None
+        if text:
+            self.filenames[_temp_filename(text_filename(filename))] = text_filename(filename)
+            self.text_fh = open(_temp_filename(text_filename(filename)), 'w')
+
+    def write(self, chunk):
+        data = chunk.as_array()
+        if self.array is None:
+            self.array = np.lib.format.open_memmap(_temp_filename(self.filename), mode='w+',
+                                                   dtype=data.dtype, shape=(self.n_rows,))
+        self.array[self.start:self.start + len(data)] = data
+
+        if self.text_fh is not None:
+            if not len(chunk):
+                # The fixed-width writer fails on empty tables, so only
+                # the header of a table with one (zero) row is used
+                header = Table(np.zeros(1, dtype=data.dtype))
+                for name in chunk.colnames:
+                    header[name].format = chunk[name].format
+                chunk = header
+            lines = io.StringIO()
+            chunk.write(lines, format=TABLE_FORMAT)
+            lines = lines.getvalue().splitlines(True)
+            if not len(data):
+                lines = lines[:2]
+            # Only write the (two line) header for the first chunk
+            self.text_fh.writelines(lines if self.start == 0 else lines[2:])
+
+        self.start += len(data)
+
+    def close(self, check=True):
+        """Close the file and check that ``n_rows`` rows were written.
+
+        Only then the results are moved to ``filename``. With ``check=False``
+        (e.g. after an error) the temporary files are removed instead.
+        """
+        if self.text_fh is not None:
+            self.text_fh.close()
+            self.text_fh = None
+
+        if self.array is not None:
+            self.array.flush()
+            # Close the memory map before the file is moved
+            self.array = None
+
+        if check and self.start != self.n_rows:
+            self._remove_temp_files()
+            raise ValueError('Expected {} rows, got {}'.format(self.n_rows, self.start))
+
+        if check:
+            for temp_filename, filename in self.filenames.items():
+                if os.path.exists(temp_filename):
+                    os.replace(temp_filename, filename)
+        else:
+            self._remove_temp_files()
+
+    def _remove_temp_files(self):
+        for temp_filename in self.filenames:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(check=exc_type is None)
+
+
+def write_table_chunks(chunks, filename, n_rows, text=False):
+    """Write a table given as an iterable of chunks to a `.npy` file.
+
+    Chunks are written to disk one at a time, so memory use only depends on
+    the chunk size, not on the total number of rows ``n_rows``.
+    With ``text=True`` the table is also exported like in `write_table`.
+    """
+    with TableChunkWriter(filename, n_rows, text=text) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+
+
+def read_table(filename):
+    """Read a table from a `.npy` file.
+
+    The file is memory-mapped read-only, i.e. columns are only read from
+    disk when accessed and can't be modified in place.
+    """
     logging.debug('Reading {}'.format(filename))
+    return Table(np.load(filename, mmap_mode='r'), copy=False)
 
-    table = Table.read(filename, format='ascii')
+
+def input_filename(name):
+    return os.path.join('input', name + BINARY_EXTENSION)
+
+
+def input_path(name):
+    """Path of the file that input table ``name`` is read from."""
+    filename = input_filename(name)
+    if os.path.exists(filename):
+        return filename
+    return text_filename(filename)
+
+
+def read_input_table(name):
+    """Read input table ``name`` (`.npy` file, or the text file as fallback)."""
+    filename = input_path(name)
+    if filename.endswith(BINARY_EXTENSION):
+        return read_table(filename)
+
+    logging.debug('Reading {} (run `convert-tables` to speed this up)'.format(filename))
+    return Table.read(filename, format=TABLE_FORMAT)
+
+
+def get_observers(use_subset=False):
+    table = read_input_table('observers')
 
     if use_subset:
         table = table[:5]
@@ -100,9 +389,7 @@ def get_observers(use_subset=False):
 
 
 def get_positions(symmetric=False, use_subset=False):
-    filename = 'input/skycoords.txt'
-    table = Table.read(filename, format='ascii',
-                       names=['lon', 'lat'])
+    table = read_input_table('skycoords')
 
     if symmetric:
         lon = table['lon']
@@ -118,20 +405,47 @@ def get_test_module(name):
     return import_module('coordinates_benchmark.tools.' + name)
 
 
+def supports_systems(module, systems):
+    """Check if a tool module supports a given celestial conversion."""
+    supported_systems = getattr(module, 'SUPPORTED_SYSTEMS', CELESTIAL_SYSTEMS)
+    return set(systems.values()).issubset(supported_systems)
+
+
 def celestial_filename(tool, systems):
-    fmt = 'output/tools/{}/{}_to_{}.txt'
+    fmt = 'output/tools/{}/{}_to_{}' + BINARY_EXTENSION
     return fmt.format(tool, systems['in'], systems['out'])
 
 
+def task_label(tool, systems):
+    """Label for one (tool, conversion) task, used in log messages."""
+    return '{} {} -> {}'.format(tool, systems['in'], systems['out'])
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _load_celestial_results(tool, system_in, system_out):
+    """Memory-map the columns of one results file.
+
+    The maps are cached, so that each file is only opened once by the summary
+    and plot commands. They aren't copied into memory, which one process
+    couldn't hold for large N, but read from disk (or the OS page cache) on access.
+    """
+    filename = celestial_filename(tool, {'in': system_in, 'out': system_out})
+    table = read_table(filename)
+    return table['lon'].data, table['lat'].data
+
+
+def clear_results_cache():
+    """Forget cached results (e.g. after re-running a tool)."""
+    _load_celestial_results.cache_clear()
+
+
 def celestial_results(tool, systems, symmetric=False):
-    filename = celestial_filename(tool, systems)
-    table = Table.read(filename, format=TABLE_FORMAT)
+    lon, lat = _load_celestial_results(tool, systems['in'], systems['out'])
 
     if symmetric:
-        lon = table['lon']
-        table['lon'] = np.where(lon > 180, lon - 360, lon)
+        lon = np.where(lon > 180, lon - 360, lon)
 
-    return table
+    return Table([lon, lat], names=['lon', 'lat'], copy=False)
 
 
 # TODO: switch internally to radians and get rid of this helper function!
@@ -148,20 +462,174 @@ def angular_separation_deg_to_arcsec(lon1, lat1, lon2, lat2):
     return Angle(separation, 'radian').to('arcsec').value
 
 
-def celestial_separation_table(tool1, tool2, systems):
+def celestial_separation(tool1, tool2, systems):
+    """Separation (in arcsec) between the results of two tools.
+
+    Separations aren't cached, each plot needs a different tool pair and conversion.
+    """
     c1 = celestial_results(tool1, systems, symmetric=True)
     c2 = celestial_results(tool2, systems, symmetric=True)
-    table = c1.copy()
-    table['separation'] = angular_separation_deg_to_arcsec(c1['lon'], c1['lat'], c2['lon'], c2['lat'])
+    return angular_separation_deg_to_arcsec(c1['lon'], c1['lat'], c2['lon'], c2['lat'])
+
+
+def celestial_separation_table(tool1, tool2, systems):
+    table = celestial_results(tool1, systems, symmetric=True)
+    table['separation'] = celestial_separation(tool1, tool2, systems)
 
     return table
 
 
+def file_hash(filename):
+    """SHA-256 hex digest of a file's contents.
+
+    Hashes are cached as long as the file size and modification time
+    don't change, since input files can be large.
+    """
+    stat = os.stat(filename)
+    return _file_hash(filename, stat.st_size, stat.st_mtime)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _file_hash(filename, size, mtime):
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(2 ** 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def celestial_task_key(tool, systems):
+    """Hash of everything that determines the results of one celestial task.
+
+    That is the input positions, the tool adapter module source code,
+    the tool version and the conversion.
+    """
+    module = get_test_module(tool)
+    tool_info = get_tool_info()
+    version = tool_info['version'][tool_info['tool_name'] == tool][0]
+    key = dict(input=file_hash(input_path('skycoords')),
+               module=file_hash(module.__file__),
+               version=str(version),
+               systems=[systems['in'], systems['out']])
+    key = json.dumps(key, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(key).hexdigest()
+
+
+def manifest_filename():
+    return 'output/tools/manifest.json'
+
+
+def plot_manifest_filename():
+    return 'output/plots/manifest.json'
+
+
+def read_manifest(filename=None):
+    """Read a manifest (output filename -> task key).
+
+    By default the results manifest, see `manifest_filename`.
+    """
+    filename = filename or manifest_filename()
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as fh:
+        return json.load(fh)
+
+
+def write_manifest(manifest, filename=None):
+    filename = filename or manifest_filename()
+    logging.debug('Writing {}'.format(filename))
+    with open(filename, 'w') as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+
+
+def failures_filename():
+    return 'output/tools/failures.json'
+
+
+def read_failures():
+    """Read the task failures of the last runs (output filename -> error)."""
+    filename = failures_filename()
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as fh:
+        return json.load(fh)
+
+
+def write_failures(failures):
+    filename = failures_filename()
+    if failures:
+        logging.info('Writing {} ({} failed)'.format(filename, len(failures)))
+        with open(filename, 'w') as fh:
+            json.dump(failures, fh, indent=1, sort_keys=True)
+    elif os.path.exists(filename):
+        os.remove(filename)
+
+
 def horizontal_filename(tool):
-    fmt = 'output/tools/{}/coords_fk5_to_horizontal.txt'
+    fmt = 'output/tools/{}/coords_fk5_to_horizontal' + BINARY_EXTENSION
     return fmt.format(tool)
 
 
+def horizontal_shards_dir(tool):
+    """Directory of the shard results of one `benchmark_horizontal` run."""
+    return 'output/tools/{}/horizontal_shards'.format(tool)
+
+
+def horizontal_shard_filename(tool, start, stop):
+    """Results for the observers ``start:stop`` (see `benchmark_horizontal`)."""
+    fmt = '{}/observers_{:06d}_{:06d}' + BINARY_EXTENSION
+    return fmt.format(horizontal_shards_dir(tool), start, stop)
+
+
+def horizontal_timing_filename(tool):
+    return 'output/tools/{}/coords_fk5_to_horizontal_timing.txt'.format(tool)
+
+
+def speed_filename():
+    return 'output/speed.txt'
+
+
+def summary_data_filename(extension='.json'):
+    """Summary data, written by `summary-celestial` and read by `render-summary`."""
+    return 'output/summary_data' + extension
+
+
+def memory_filename():
+    return 'output/memory.txt'
+
+
+def coldstart_filename():
+    return 'output/coldstart.txt'
+
+
+def coldstart_importtime_filename(tool):
+    return 'output/coldstart/{}_importtime.txt'.format(tool)
+
+
+def scaling_filename():
+    return 'output/scaling.txt'
+
+
+def scaling_fit_filename():
+    return 'output/scaling_fit.txt'
+
+
+def scaling_plot_filename(systems):
+    return 'output/plots/scaling_{}_to_{}.png'.format(systems['in'], systems['out'])
+
+
+def profiles_dir(tool):
+    return 'output/profiles/{}'.format(tool)
+
+
+def profile_filename(tool, name, extension):
+    return '{}/{}{}'.format(profiles_dir(tool), name, extension)
+
+
+def profile_index_filename():
+    return 'output/profiles/index.html'
+
+
 def plot_filename(tool1, tool2, systems, inc_root_dir=True):
     root_dir = ""
     if inc_root_dir:
@@ -170,6 +638,20 @@ def plot_filename(tool1, tool2, systems, inc_root_dir=True):
     return fmt.format(tool1, tool2, systems['in'], systems['out'])
 
 
+def plot_thumbnail_filename(tool1, tool2, systems, inc_root_dir=True):
+    """Small version of `plot_filename`, shown in the report page."""
+    root_dir = ""
+    if inc_root_dir:
+        root_dir = "output/"
+    fmt = root_dir + 'plots/thumbnails/{}_vs_{}_for_{}_to_{}.png'
+    return fmt.format(tool1, tool2, systems['in'], systems['out'])
+
+
+def report_filename(name):
+    """Data files of the report page (``output/report.html``), loaded on demand."""
+    return 'output/report/' + name
+
+
 def make_output_dir(path):
     """Make a dir in `outputs` if it doesn't exist already."""
     path = os.path.join('output', path)
@@ -177,7 +659,7 @@ def make_output_dir(path):
         logging.debug('Directory exists: {}'.format(path))
     else:
         logging.info('Making directory: {}'.format(path))
-        os.makedirs(path)
+        os.makedirs(path, exist_ok=True)
 
 
 def make_tool_output_dir(tool):
@@ -0,0 +1,283 @@
+// Summary report, which only loads what is shown.
+//
+// `report/index.json` lists the tools and conversions, the stats of each
+// conversion are in `report/<in>_to_<out>.json` and are fetched when the
+// conversion is selected. Plots are shown as thumbnails, the full size
+// plot is only loaded on click. See `write_report` in
+// `coordinates_benchmark/commands/html.py`.
+(function () {
+    'use strict';
+
+    var STATS_NAMES = ['median', 'mean', 'max', 'std'];
+    var cache = {};
+    var index = null;
+
+    function accuracyColor(mean) {
+        // Same thresholds (in arcsec) as `_accuracy_color` in `html.py`
+        if (mean > 1) {
+            return 'red';
+        }
+        if (mean > 0.01) {
+            return 'orange';
+        }
+        return 'green';
+    }
+
+    function loadJSON(name) {
+        if (!cache[name]) {
+            cache[name] = fetch('report/' + name).then(function (response) {
+                if (!response.ok) {
+                    throw new Error('Could not load report/' + name);
+                }
+                return response.json();
+            });
+        }
+        return cache[name];
+    }
+
+    function element(tag, text, className) {
+        var el = document.createElement(tag);
+        if (text !== undefined && text !== null) {
+            el.textContent = text;
+        }
+        if (className) {
+            el.className = className;
+        }
+        return el;
+    }
+
+    function formatNumber(value, format) {
+        return value === null ? '—' : format(value);
+    }
+
+    function speedFormat(value) {
+        return value.toPrecision(4);
+    }
+
+    function memoryFormat(value) {
+        return value.toFixed(1);
+    }
+
+    function showPlot(plot) {
+        var viewer = document.getElementById('viewer');
+        document.getElementById('viewer-image').src = plot;
+        viewer.hidden = false;
+    }
+
+    function hidePlot() {
+        var viewer = document.getElementById('viewer');
+        viewer.hidden = true;
+        document.getElementById('viewer-image').removeAttribute('src');
+    }
+
+    function thumbnail(pair) {
+        var img = element('img', null, 'thumbnail');
+        img.loading = 'lazy';
+        img.src = pair.thumbnail;
+        img.alt = pair.tool1 + ' vs ' + pair.tool2;
+        img.title = 'Click to show the full plot';
+        img.onclick = function () {
+            showPlot(pair.plot);
+        };
+        img.onerror = function () {
+            img.replaceWith(element('span', 'no plot'));
+        };
+        return img;
+    }
+
+    function renderList(data) {
+        var table = element('table');
+        table.align = 'center';
+
+        var header = element('tr');
+        ['Tool 1', 'Tool 2', 'Median', 'Mean', 'Max', 'Std. Dev.', 'Plot'].forEach(function (name) {
+            header.appendChild(element('th', name));
+        });
+        table.appendChild(header);
+
+        data.pairs.forEach(function (pair) {
+            var row = element('tr');
+            var color = accuracyColor(pair.mean);
+            row.appendChild(element('td', pair.tool1));
+            row.appendChild(element('td', pair.tool2));
+            STATS_NAMES.forEach(function (name) {
+                var cell = element('td', pair[name].toFixed(6), color);
+                cell.align = 'right';
+                row.appendChild(cell);
+            });
+            var cell = element('td');
+            cell.appendChild(thumbnail(pair));
+            row.appendChild(cell);
+            table.appendChild(row);
+        });
+
+        return table;
+    }
+
+    function renderMatrix(data) {
+        var pairs = {};
+        data.pairs.forEach(function (pair) {
+            pairs[pair.tool1 + ' ' + pair.tool2] = pair;
+            pairs[pair.tool2 + ' ' + pair.tool1] = pair;
+        });
+
+        var table = element('table');
+        table.align = 'center';
+
+        var header = element('tr');
+        header.appendChild(element('th'));
+        data.tools.forEach(function (tool) {
+            header.appendChild(element('th', tool));
+        });
+        table.appendChild(header);
+
+        data.tools.forEach(function (tool1) {
+            var row = element('tr');
+            row.appendChild(element('th', tool1));
+            data.tools.forEach(function (tool2) {
+                var pair = pairs[tool1 + ' ' + tool2];
+                if (!pair) {
+                    row.appendChild(element('td', '—'));
+                    return;
+                }
+                var cell = element('td', null, accuracyColor(pair.mean) + ' matrix-cell');
+                cell.title = STATS_NAMES.map(function (name) {
+                    return name + ': ' + pair[name].toFixed(6);
+                }).join('\n');
+                cell.appendChild(element('div', pair.mean.toFixed(6)));
+                cell.appendChild(thumbnail(pair));
+                row.appendChild(cell);
+            });
+            table.appendChild(row);
+        });
+
+        return table;
+    }
+
+    function renderPerformance(data) {
+        if (!data.performance.length) {
+            return null;
+        }
+
+        var table = element('table');
+        table.align = 'center';
+
+        var header = element('tr');
+        ['Tool', 'Coords/sec', 'Peak RSS', 'Traced peak'].forEach(function (name) {
+            header.appendChild(element('th', name));
+        });
+        table.appendChild(header);
+
+        data.performance.forEach(function (entry) {
+            var row = element('tr');
+            row.appendChild(element('td', entry.tool));
+            [
+                formatNumber(entry.coords_per_sec, speedFormat),
+                formatNumber(entry.rss_per_coord, memoryFormat),
+                formatNumber(entry.traced_per_coord, memoryFormat)
+            ].forEach(function (value) {
+                var cell = element('td', value);
+                cell.align = 'right';
+                row.appendChild(cell);
+            });
+            table.appendChild(row);
+        });
+
+        return table;
+    }
+
+    function renderColdstart(coldstart) {
+        if (!coldstart.length) {
+            return null;
+        }
+
+        var table = element('table');
+        table.align = 'center';
+
+        var header = element('tr');
+        ['Tool', 'Function', 'Base import', 'Tool import', 'First call', 'Steady call'].forEach(function (name) {
+            header.appendChild(element('th', name));
+        });
+        table.appendChild(header);
+
+        coldstart.forEach(function (entry) {
+            var row = element('tr');
+            row.appendChild(element('td', entry.tool));
+            row.appendChild(element('td', entry['function'] + ' (' + entry.system_in + ' → ' + entry.system_out + ')'));
+            ['base_import', 'tool_import', 'first_call', 'steady_call'].forEach(function (name) {
+                var cell = element('td', entry[name].toFixed(3));
+                cell.align = 'right';
+                row.appendChild(cell);
+            });
+            table.appendChild(row);
+        });
+
+        return table;
+    }
+
+    function appendSection(report, title, table) {
+        var note = element('p', title);
+        note.align = 'center';
+        report.appendChild(note);
+        report.appendChild(table);
+    }
+
+    function render() {
+        var report = document.getElementById('report');
+        var conversion = index.conversions[document.getElementById('conversion').value];
+        var view = document.getElementById('view').value;
+
+        window.location.hash = conversion.name + '/' + view;
+
+        loadJSON(conversion.file).then(function (data) {
+            var title = element('h2', data.in + ' to ' + data.out);
+            var content = view === 'list' ? renderList(data) : renderMatrix(data);
+            var performance = renderPerformance(data);
+
+            var coldstart = renderColdstart(index.coldstart || []);
+
+            report.replaceChildren(title, content);
+            if (performance) {
+                appendSection(report, 'Speed in coordinates per second, memory use in bytes per coordinate', performance);
+            }
+            if (coldstart) {
+                appendSection(report, 'Cold start: import and call times in ms, measured in fresh processes', coldstart);
+            }
+        }).catch(function (error) {
+            report.replaceChildren(element('p', error.message));
+        });
+    }
+
+    function init() {
+        var select = document.getElementById('conversion');
+        var hash = window.location.hash.slice(1).split('/');
+
+        index.conversions.forEach(function (conversion, i) {
+            var option = element('option', conversion.in + ' → ' + conversion.out + ' (' + conversion.n_pairs + ' pairs)');
+            option.value = i;
+            option.selected = conversion.name === hash[0];
+            select.appendChild(option);
+        });
+        if (hash[1]) {
+            document.getElementById('view').value = hash[1];
+        }
+
+        select.onchange = render;
+        document.getElementById('view').onchange = render;
+        document.getElementById('viewer').onclick = hidePlot;
+        document.addEventListener('keydown', function (event) {
+            if (event.key === 'Escape') {
+                hidePlot();
+            }
+        });
+
+        render();
+    }
+
+    loadJSON('index.json').then(function (data) {
+        index = data;
+        init();
+    }).catch(function (error) {
+        document.getElementById('report').replaceChildren(element('p', error.message));
+    });
+}());